@@ -0,0 +1,141 @@
+# aggregates.py
+# O(1) running statistics over a stream of readings
+
+import math
+import threading
+from collections import deque
+
+
+def reading_values(record):
+    """Numeric channels of one reading"""
+    sensors = record.get("sensor_readings", {})
+    quality = record.get("water_quality", {})
+    waste = record.get("waste", {})
+    return {
+        "pH": sensors.get("pH", 0),
+        "turbidity": sensors.get("turbidity", 0),
+        "temperature": sensors.get("temperature", 0),
+        "TDS": sensors.get("TDS", 0),
+        "score": quality.get("score", 0),
+        "waste_weight": waste.get("weight", 0) or 0,
+    }
+
+
+class RunningAggregates:
+    """
+    Running aggregates updated once per reading
+
+    Per channel: count, sum, sum of squares, min, max (whole history)
+    plus a sliding-window sum over the last `window` readings. Waste items
+    are counted by type. Every query is O(1) regardless of history size.
+    """
+
+    CHANNELS = ("pH", "turbidity", "temperature", "TDS", "score", "waste_weight")
+
+    def __init__(self, window=50):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.sums = dict.fromkeys(self.CHANNELS, 0.0)
+            self.sumsq = dict.fromkeys(self.CHANNELS, 0.0)
+            self.mins = dict.fromkeys(self.CHANNELS, math.inf)
+            self.maxs = dict.fromkeys(self.CHANNELS, -math.inf)
+            self.waste_items = 0
+            self.waste_by_type = {}
+            self.status_counts = {}
+            self.anomalies = 0
+            self.anomalies_by_channel = {}
+
+            self._window_values = deque()
+            self._window_sums = dict.fromkeys(self.CHANNELS, 0.0)
+            self._evictions = 0
+
+    def add(self, record):
+        values = reading_values(record)
+        waste = record.get("waste", {})
+        status = record.get("water_quality", {}).get("status")
+        anomalies = record.get("water_quality", {}).get("anomalies")
+
+        with self._lock:
+            self.count += 1
+            for name, value in values.items():
+                self.sums[name] += value
+                self.sumsq[name] += value * value
+                if value < self.mins[name]:
+                    self.mins[name] = value
+                if value > self.maxs[name]:
+                    self.maxs[name] = value
+
+            if waste.get("detected"):
+                # Window summaries (edge aggregation) carry several items
+                by_type = record.get("summary", {}).get("waste_by_type") or {waste.get("type") or "unknown": 1}
+                for waste_type, n in by_type.items():
+                    self.waste_items += n
+                    self.waste_by_type[waste_type] = self.waste_by_type.get(waste_type, 0) + n
+            if status:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if anomalies:
+                self.anomalies += 1
+                for name in anomalies:
+                    self.anomalies_by_channel[name] = self.anomalies_by_channel.get(name, 0) + 1
+
+            self._window_values.append(values)
+            for name, value in values.items():
+                self._window_sums[name] += value
+            if len(self._window_values) > self.window:
+                evicted = self._window_values.popleft()
+                for name, value in evicted.items():
+                    self._window_sums[name] -= value
+                self._evictions += 1
+                # Re-sum now and then so add/subtract rounding can't drift
+                if self._evictions >= self.window:
+                    self._resum_window()
+
+    def _resum_window(self):
+        self._evictions = 0
+        for name in self.CHANNELS:
+            self._window_sums[name] = math.fsum(v[name] for v in self._window_values)
+
+    # ---------- queries ----------
+
+    def mean(self, name):
+        return self.sums[name] / self.count if self.count else 0.0
+
+    def std(self, name):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean(name)
+        variance = max(0.0, self.sumsq[name] / self.count - mean * mean)
+        return math.sqrt(variance)
+
+    def window_mean(self, name):
+        n = len(self._window_values)
+        return self._window_sums[name] / n if n else 0.0
+
+    def channel(self, name):
+        if not self.count:
+            return {"mean": 0.0, "std": 0.0, "min": None, "max": None, "window_mean": 0.0}
+        return {
+            "mean": round(self.mean(name), 4),
+            "std": round(self.std(name), 4),
+            "min": self.mins[name],
+            "max": self.maxs[name],
+            "window_mean": round(self.window_mean(name), 4)
+        }
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "window": min(self.window, len(self._window_values)),
+                "channels": {name: self.channel(name) for name in self.CHANNELS},
+                "waste_items": self.waste_items,
+                "waste_by_type": dict(self.waste_by_type),
+                "status_counts": dict(self.status_counts),
+                "anomalies": self.anomalies,
+                "anomalies_by_channel": dict(self.anomalies_by_channel)
+            }
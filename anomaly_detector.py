@@ -0,0 +1,87 @@
+# anomaly_detector.py
+# Streaming per-channel anomaly detection (EWMA mean/variance z-scores)
+
+import math
+import threading
+
+from quality_rules import CHANNELS
+
+
+class AnomalyDetector:
+    """
+    Flags readings that are far from each channel's recent behaviour
+
+    Per channel it keeps an exponentially weighted mean and variance
+    (weight `alpha` for the newest reading), so each update is O(1) time
+    and memory no matter how long the robot runs. A reading is scored
+    against the state *before* it arrives: z = (x - mean) / std, and
+    |z| > `threshold` flags the channel once `warmup` readings have been
+    seen.
+
+    A flagged value is clipped to mean +/- threshold * std before it is
+    folded in, so one spike cannot drag the baseline along with it, while
+    a real level shift is still absorbed within a few dozen readings.
+    `min_std` is the noise floor (sensor resolution) that keeps a very
+    steady channel from flagging on the smallest change.
+    """
+
+    def __init__(self, alpha=0.05, threshold=4.0, warmup=30, min_std=0.01):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_std = min_std
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.mean = dict.fromkeys(CHANNELS, 0.0)
+            self.var = dict.fromkeys(CHANNELS, 0.0)
+
+    def update(self, sensor_data):
+        """
+        Fold in one reading
+        Returns: {channel: z-score} for the channels flagged as anomalous
+        """
+        flagged = {}
+        with self._lock:
+            self.count += 1
+            for name in CHANNELS:
+                x = sensor_data[name]
+                if self.count == 1:
+                    self.mean[name] = float(x)
+                    continue
+
+                mean = self.mean[name]
+                std = max(math.sqrt(self.var[name]), self.min_std)
+                z = (x - mean) / std
+                if self.count > self.warmup and abs(z) > self.threshold:
+                    flagged[name] = round(z, 2)
+                    x = mean + math.copysign(self.threshold * std, z)
+
+                # Incremental EWMA mean/variance
+                diff = x - mean
+                incr = self.alpha * diff
+                self.mean[name] = mean + incr
+                self.var[name] = (1 - self.alpha) * (self.var[name] + diff * incr)
+        return flagged
+
+    def prime(self, readings):
+        """Warm up from stored readings (dicts with sensor_readings) without reporting"""
+        for record in readings:
+            sensors = record.get("sensor_readings")
+            if sensors and all(name in sensors for name in CHANNELS):
+                self.update(sensors)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "readings": self.count,
+                "warmed_up": self.count > self.warmup,
+                "threshold": self.threshold,
+                "channels": {
+                    name: {"mean": round(self.mean[name], 4), "std": round(math.sqrt(self.var[name]), 4)}
+                    for name in CHANNELS
+                }
+            }
@@ -1,7 +1,7 @@
 # app_with_reset_button.py
 # ADDED - Reset button to clear river data
 
-from flask import Flask, jsonify, render_template_string, request, send_file
+from flask import Flask, Response, jsonify, render_template_string, request, send_file
 from flask_cors import CORS
 from datetime import datetime
 import json
@@ -13,13 +13,29 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib import colors
 from io import BytesIO, StringIO
 import csv
-import statistics
+import hashlib
+import itertools
+import time
+import numpy as np
 
 import robot_controller_final_fixed as rc
+from data_storage import open_storage, cached_snapshot, file_signature
+from event_bus import sse_frame
+from model_retrainer import ModelRetrainer
+from inference_service import get_inference_service
+from quality_predictor import get_shared_predictor
+from quality_rules import CHANNELS, get_rules
+from mission_scheduler import get_scheduler
+from fleet import check_river_id
 
 app = Flask(__name__)
 CORS(app)
 
+STREAM_KEEPALIVE = 15  # seconds between SSE comments on an idle stream
+MAX_LONG_POLL = 30     # seconds a /since request may wait for new data
+# seconds, 0 (default) = on demand only: training labels are the model's own scores
+RETRAIN_INTERVAL = int(os.environ.get("AQUATIC_RETRAIN_INTERVAL", "0"))
+
 # ==================== RIVER NAMES STORAGE ====================
 
 RIVER_NAMES_FILE = "river_names.json"
@@ -533,11 +549,26 @@ DASHBOARD_HTML = """
         let currentRiver = 'river1';
         let renamingRiver = null;
         let chart1 = null, chart2 = null;
+        let stream = null, pollTimer = null, chartReadings = [];
+        const etags = {}, etagCache = {};
+        
+        /* GET JSON with If-None-Match; a 304 reuses the last payload */
+        async function fetchJSON(url) {
+            const headers = etags[url] ? { 'If-None-Match': etags[url] } : {};
+            const res = await fetch(url, { headers });
+            if (res.status === 304) return etagCache[url];
+            const data = await res.json();
+            const etag = res.headers.get('ETag');
+            if (etag) {
+                etags[url] = etag;
+                etagCache[url] = data;
+            }
+            return data;
+        }
         
         async function loadRiverNames() {
             try {
-                const res = await fetch('/api/river-names');
-                const names = await res.json();
+                const names = await fetchJSON('/api/river-names');
                 renderRivers(names);
             } catch(e) {
                 console.error(e);
@@ -570,7 +601,7 @@ DASHBOARD_HTML = """
             const activeBtn = document.querySelector('.river-btn.active');
             const riverName = activeBtn ? activeBtn.textContent.trim() : 'Unknown';
             document.getElementById('river-title').textContent = '📍 Monitoring: ' + riverName;
-            fetchData();
+            connectStream();
         }
         
         function openRenameModal(river) {
@@ -672,35 +703,16 @@ DASHBOARD_HTML = """
         
         async function fetchData() {
             try {
-                const statusRes = await fetch(`/api/robot/status?river=${currentRiver}`);
-                const status = await statusRes.json();
+                const status = await fetchJSON(`/api/robot/status?river=${currentRiver}`);
                 
                 if (!status.error) {
-                    document.getElementById('robot-id').textContent = status.robot_id;
-                    const badge = document.getElementById('status-badge');
-                    if (status.is_running) {
-                        badge.textContent = '🟢 RUNNING';
-                        badge.style.background = 'rgba(76,175,80,0.2)';
-                    } else {
-                        badge.textContent = '🟡 IDLE';
-                        badge.style.background = 'rgba(255,152,0,0.2)';
-                    }
-                    document.getElementById('mission-count').textContent = status.mission_count;
-                    document.getElementById('data-count').textContent = status.data_points;
-                    document.getElementById('waste-total').textContent = status.waste_collected.toFixed(2);
-                    document.getElementById('waste-items').textContent = status.waste_items;
+                    renderStatus(status);
                 }
                 
-                const res = await fetch(`/api/dashboard/summary?river=${currentRiver}`);
-                const data = await res.json();
+                const data = await fetchJSON(`/api/dashboard/summary?river=${currentRiver}`);
                 
                 if (data.current) {
-                    document.getElementById('score').textContent = data.current.quality_score.toFixed(1);
-                    document.getElementById('status').textContent = 'Status: ' + data.current.status;
-                    document.getElementById('ph').textContent = data.current.pH.toFixed(2);
-                    document.getElementById('turbidity').textContent = data.current.turbidity.toFixed(2);
-                    document.getElementById('temp').textContent = data.current.temperature.toFixed(1);
-                    document.getElementById('tds').textContent = data.current.TDS.toFixed(0);
+                    renderCurrent(data.current);
                     updateCharts();
                 }
             } catch(e) {
@@ -708,79 +720,161 @@ DASHBOARD_HTML = """
             }
         }
         
+        function renderStatus(status) {
+            document.getElementById('robot-id').textContent = status.robot_id;
+            const badge = document.getElementById('status-badge');
+            if (status.is_running) {
+                badge.textContent = '🟢 RUNNING';
+                badge.style.background = 'rgba(76,175,80,0.2)';
+            } else {
+                badge.textContent = '🟡 IDLE';
+                badge.style.background = 'rgba(255,152,0,0.2)';
+            }
+            document.getElementById('mission-count').textContent = status.mission_count;
+            document.getElementById('data-count').textContent = status.data_points;
+            document.getElementById('waste-total').textContent = status.waste_collected.toFixed(2);
+            document.getElementById('waste-items').textContent = status.waste_items;
+        }
+        
+        function renderCurrent(current) {
+            document.getElementById('score').textContent = current.quality_score.toFixed(1);
+            document.getElementById('status').textContent = 'Status: ' + current.status;
+            document.getElementById('ph').textContent = current.pH.toFixed(2);
+            document.getElementById('turbidity').textContent = current.turbidity.toFixed(2);
+            document.getElementById('temp').textContent = current.temperature.toFixed(1);
+            document.getElementById('tds').textContent = current.TDS.toFixed(0);
+        }
+        
         async function updateCharts() {
             try {
-                const res = await fetch(`/api/water-quality/latest?river=${currentRiver}`);
-                const data = await res.json();
+                const data = await fetchJSON(`/api/water-quality/latest?river=${currentRiver}`);
                 
                 if (data.data && data.data.length > 0) {
-                    const readings = data.data;
-                    const labels = readings.map(r => new Date(r.timestamp).toLocaleTimeString());
-                    const scores = readings.map(r => r.water_quality.score);
-                    const phVals = readings.map(r => r.sensor_readings.pH);
-                    const turbVals = readings.map(r => r.sensor_readings.turbidity);
-                    const tempVals = readings.map(r => r.sensor_readings.temperature);
-                    
-                    if (chart1) {
-                        chart1.data.labels = labels;
-                        chart1.data.datasets[0].data = scores;
-                        chart1.update();
-                    } else {
-                        const ctx = document.getElementById('chart1').getContext('2d');
-                        chart1 = new Chart(ctx, {
-                            type: 'line',
-                            data: {
-                                labels: labels,
-                                datasets: [{
-                                    label: 'Quality',
-                                    data: scores,
-                                    borderColor: '#667eea',
-                                    backgroundColor: 'rgba(102,126,234,0.1)',
-                                    borderWidth: 2,
-                                    fill: true,
-                                    tension: 0.4
-                                }]
-                            },
-                            options: {
-                                responsive: true,
-                                maintainAspectRatio: false,
-                                scales: { y: { beginAtZero: true, max: 100 } }
-                            }
-                        });
-                    }
-                    
-                    if (chart2) {
-                        chart2.data.labels = labels;
-                        chart2.data.datasets[0].data = phVals;
-                        chart2.data.datasets[1].data = turbVals;
-                        chart2.data.datasets[2].data = tempVals;
-                        chart2.update();
-                    } else {
-                        const ctx = document.getElementById('chart2').getContext('2d');
-                        chart2 = new Chart(ctx, {
-                            type: 'line',
-                            data: {
-                                labels: labels,
-                                datasets: [
-                                    { label: 'pH', data: phVals, borderColor: '#8bc34a', borderWidth: 2 },
-                                    { label: 'Turbidity', data: turbVals, borderColor: '#ff9800', borderWidth: 2 },
-                                    { label: 'Temp', data: tempVals, borderColor: '#f44336', borderWidth: 2 }
-                                ]
-                            },
-                            options: { responsive: true, maintainAspectRatio: false }
-                        });
-                    }
+                    chartReadings = data.data;
+                    renderCharts(chartReadings);
                 }
             } catch(e) {
                 console.error(e);
             }
         }
         
+        function renderCharts(readings) {
+            if (readings.length === 0) return;
+            const labels = readings.map(r => new Date(r.timestamp).toLocaleTimeString());
+            const scores = readings.map(r => r.water_quality.score);
+            const phVals = readings.map(r => r.sensor_readings.pH);
+            const turbVals = readings.map(r => r.sensor_readings.turbidity);
+            const tempVals = readings.map(r => r.sensor_readings.temperature);
+            
+            if (chart1) {
+                chart1.data.labels = labels;
+                chart1.data.datasets[0].data = scores;
+                chart1.update();
+            } else {
+                const ctx = document.getElementById('chart1').getContext('2d');
+                chart1 = new Chart(ctx, {
+                    type: 'line',
+                    data: {
+                        labels: labels,
+                        datasets: [{
+                            label: 'Quality',
+                            data: scores,
+                            borderColor: '#667eea',
+                            backgroundColor: 'rgba(102,126,234,0.1)',
+                            borderWidth: 2,
+                            fill: true,
+                            tension: 0.4
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        scales: { y: { beginAtZero: true, max: 100 } }
+                    }
+                });
+            }
+            
+            if (chart2) {
+                chart2.data.labels = labels;
+                chart2.data.datasets[0].data = phVals;
+                chart2.data.datasets[1].data = turbVals;
+                chart2.data.datasets[2].data = tempVals;
+                chart2.update();
+            } else {
+                const ctx = document.getElementById('chart2').getContext('2d');
+                chart2 = new Chart(ctx, {
+                    type: 'line',
+                    data: {
+                        labels: labels,
+                        datasets: [
+                            { label: 'pH', data: phVals, borderColor: '#8bc34a', borderWidth: 2 },
+                            { label: 'Turbidity', data: turbVals, borderColor: '#ff9800', borderWidth: 2 },
+                            { label: 'Temp', data: tempVals, borderColor: '#f44336', borderWidth: 2 }
+                        ]
+                    },
+                    options: { responsive: true, maintainAspectRatio: false }
+                });
+            }
+        }
+        
+        /* Live updates: SSE stream, polling only while the stream is down */
+        function connectStream() {
+            if (stream) stream.close();
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            
+            stream = new EventSource(`/api/stream?river=${currentRiver}`);
+            stream.addEventListener('open', stopPolling);
+            
+            stream.addEventListener('snapshot', (e) => {
+                const data = JSON.parse(e.data);
+                renderStatus(data.status);
+                if (data.summary.current) renderCurrent(data.summary.current);
+                chartReadings = data.latest;
+                renderCharts(chartReadings);
+            });
+            
+            stream.addEventListener('reading', (e) => {
+                const data = JSON.parse(e.data);
+                const r = data.reading;
+                renderStatus(data.status);
+                renderCurrent({
+                    quality_score: r.water_quality.score,
+                    status: r.water_quality.status,
+                    pH: r.sensor_readings.pH,
+                    turbidity: r.sensor_readings.turbidity,
+                    temperature: r.sensor_readings.temperature,
+                    TDS: r.sensor_readings.TDS
+                });
+                const last = chartReadings[chartReadings.length - 1];
+                if (!last || r.timestamp > last.timestamp) {
+                    chartReadings = chartReadings.concat([r]).slice(-20);
+                    renderCharts(chartReadings);
+                }
+            });
+            
+            stream.addEventListener('status', (e) => renderStatus(JSON.parse(e.data)));
+            
+            // EventSource reconnects by itself; poll in the meantime
+            stream.onerror = startPolling;
+        }
+        
+        function startPolling() {
+            if (!pollTimer) pollTimer = setInterval(fetchData, 2000);
+        }
+        
+        function stopPolling() {
+            if (pollTimer) {
+                clearInterval(pollTimer);
+                pollTimer = null;
+            }
+        }
+        
         window.addEventListener('load', () => {
             loadRiverNames();
             selectRiver('river1');
-            fetchData();
-            setInterval(fetchData, 2000);
         });
         
         document.addEventListener('keydown', (e) => {
@@ -807,9 +901,11 @@ def health():
 
 @app.route('/api/river-names', methods=['GET'])
 def get_river_names():
-    global river_names
-    river_names = load_river_names()
-    return jsonify(river_names)
+    def build():
+        global river_names
+        river_names = load_river_names()
+        return river_names
+    return conditional_json(signature_etag(file_signature(RIVER_NAMES_FILE)), build)
 
 @app.route('/api/rename-river', methods=['POST'])
 def rename_river():
@@ -824,7 +920,11 @@ def rename_river():
     river_names[river_id] = new_name
     if save_river_names(river_names):
         if river_id in rc.robots:
-            rc.robots[river_id].river_name = new_name
+            rc.robots.update(river_id, river_name=new_name)
+        robot = rc.robots.get_loaded(river_id)
+        if robot:
+            robot.river_name = new_name
+            robot.publish_status()
         return jsonify({"status": "success", "message": "River renamed"})
     else:
         return jsonify({"status": "error", "message": "Failed to save"})
@@ -833,52 +933,82 @@ def rename_river():
 def reset_river():
     """RESET: Clear all data for a river"""
     river = request.args.get('river', 'river1')
-    data_file = f"robot_data_{river}.json"
     
     try:
-        if os.path.exists(data_file):
-            os.remove(data_file)
-        
-        # Reset robot's data
-        if river in rc.robots:
-            rc.robots[river].all_data = []
-            rc.robots[river].waste_collected = 0
+        # Reset robot's data (memory + storage)
+        robot = rc.robots.get_loaded(river)
+        if robot:
+            robot.clear_data()
+        else:
+            get_storage(river).clear()
         
         return jsonify({"status": "success", "message": f"Data for {river} cleared"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
 
-def load_river_data(river_id):
-    data_file = f"robot_data_{river_id}.json"
-    if os.path.exists(data_file):
-        try:
-            with open(data_file, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data.get('readings', [])
-                else:
-                    return data
-        except:
-            return []
-    return []
+_storages = {}
+
+def get_storage(river_id):
+    """Storage backend for a river (shared with the robot when it is loaded)"""
+    robot = rc.robots.get_loaded(river_id)
+    if robot:
+        return robot.storage
+    if river_id not in _storages:
+        data_file = rc.robots.config(river_id)["data_file"] if river_id in rc.robots else f"robot_data_{river_id}.json"
+        _storages[river_id] = open_storage(data_file)
+    return _storages[river_id]
+
+# ==================== CONDITIONAL GET ====================
+
+def signature_etag(signature):
+    return hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+
+def data_etag(river_id):
+    """ETag for a river's readings, computed without loading them"""
+    robot = rc.robots.get_loaded(river_id)
+    if robot:
+        return robot.all_data.etag()
+    return signature_etag(get_storage(river_id).signature())
+
+def conditional_json(etag, build):
+    """304 if the client already holds `etag`, else jsonify(build()) tagged with it"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def get_readings(river_id):
+    """
+    Recent readings for the polling routes without touching disk:
+    the robot's live in-memory store when it is loaded in this process,
+    otherwise a snapshot re-parsed only when the files change
+    (so polling an idle river does not build its robot)
+    """
+    robot = rc.robots.get_loaded(river_id)
+    if robot:
+        return robot.all_data
+    store, _ = cached_snapshot(get_storage(river_id))
+    return store
 
 @app.route('/api/download-report-pdf', methods=['GET'])
 def download_report_pdf():
     """Generate PDF report with before/after comparison"""
     river = request.args.get('river', 'river1')
-    data_file = f"robot_data_{river}.json"
-    
-    if not os.path.exists(data_file):
-        return jsonify({"error": "No data for this river"}), 404
+    storage = get_storage(river)
     
     try:
-        with open(data_file, 'r') as f:
-            file_data = json.load(f)
-            readings = file_data.get('readings', []) if isinstance(file_data, dict) else file_data
+        first_reading = storage.first()
         
-        if not readings:
+        if first_reading is None:
             return jsonify({"error": "No readings available"}), 404
         
+        last_reading = storage.latest(1)[-1]
+        total_readings = storage.count()
+        total_waste = storage.total_waste()
+        
         global river_names
         river_names = load_river_names()
         river_display_name = river_names.get(river, river)
@@ -915,18 +1045,13 @@ def download_report_pdf():
         )
         story.append(Paragraph(f"<b>River Name:</b> {river_display_name}", report_style))
         story.append(Paragraph(f"<b>Report Generated:</b> {datetime.now().strftime('%d-%m-%Y %H:%M:%S')}", report_style))
-        story.append(Paragraph(f"<b>Total Readings:</b> {len(readings)}", report_style))
+        story.append(Paragraph(f"<b>Total Readings:</b> {total_readings}", report_style))
         
-        if isinstance(file_data, dict):
-            total_waste = file_data.get('total_waste', 0)
-            story.append(Paragraph(f"<b>Total Waste Collected:</b> {total_waste:.2f} kg ♻️", report_style))
+        story.append(Paragraph(f"<b>Total Waste Collected:</b> {total_waste:.2f} kg ♻️", report_style))
         
         story.append(Spacer(1, 12))
         
         # BEFORE/AFTER COMPARISON
-        first_reading = readings[0]
-        last_reading = readings[-1]
-        
         section_style = ParagraphStyle(
             'SectionTitle',
             parent=styles['Heading2'],
@@ -996,10 +1121,10 @@ def download_report_pdf():
         # WASTE COLLECTION
         story.append(Paragraph("♻️ WASTE COLLECTION SUMMARY", section_style))
         
-        waste_items = [r for r in readings if r.get('waste', {}).get('detected')]
+        waste_items = storage.waste_items(limit=20)
         waste_data = [['No.', 'Type', 'Weight (kg)', 'Time']]
         
-        for idx, item in enumerate(waste_items[:20], 1):
+        for idx, item in enumerate(waste_items, 1):
             waste_data.append([
                 str(idx),
                 item['waste']['type'] or 'Unknown',
@@ -1028,12 +1153,12 @@ def download_report_pdf():
         # STATISTICS
         story.append(Paragraph("📈 OVERALL STATISTICS", section_style))
         
-        avg_quality = statistics.mean([r['water_quality']['score'] for r in readings])
-        avg_ph = statistics.mean([r['sensor_readings']['pH'] for r in readings])
-        avg_turbidity = statistics.mean([r['sensor_readings']['turbidity'] for r in readings])
-        avg_temp = statistics.mean([r['sensor_readings']['temperature'] for r in readings])
-        avg_tds = statistics.mean([r['sensor_readings']['TDS'] for r in readings])
-        total_waste = sum(r['waste']['weight'] for r in readings if r.get('waste', {}).get('weight'))
+        averages = storage.averages()
+        avg_quality = averages['score']
+        avg_ph = averages['pH']
+        avg_turbidity = averages['turbidity']
+        avg_temp = averages['temperature']
+        avg_tds = averages['TDS']
         
         stats_data = [
             ['Statistic', 'Value', 'Status'],
@@ -1070,12 +1195,25 @@ def download_report_pdf():
 
 @app.route('/api/download-report', methods=['GET'])
 def download_report():
-    """CSV download"""
+    """CSV download (optional filters: mission, start, end as ISO timestamps)"""
     river = request.args.get('river', 'river1')
-    data = load_river_data(river)
+    mission = request.args.get('mission', type=int)
+    if mission is None and request.args.get('mission'):
+        return jsonify({"error": "mission must be an integer"}), 400
+    bounds = {}
+    for name in ('start', 'end'):
+        value = request.args.get(name)
+        if value:
+            try:
+                bounds[name] = datetime.fromisoformat(value).isoformat()
+            except ValueError:
+                return jsonify({"error": f"{name} must be an ISO timestamp"}), 400
+    rows = get_storage(river).readings(mission=mission, **bounds)
+    first = next(rows, None)
     
-    if not data:
+    if first is None:
         return jsonify({"error": "No data"}), 404
+    data = itertools.chain([first], rows)
     
     try:
         global river_names
@@ -1114,7 +1252,14 @@ def download_report():
 def start_robot():
     river = request.args.get('river', 'river1')
     duration = int(request.args.get('duration', 300))
-    return jsonify(rc.start_mission_api(river, duration))
+    rate = request.args.get('rate', type=float)
+    return jsonify(rc.start_mission_api(river, duration, rate))
+
+@app.route('/api/robot/sample-rate', methods=['POST'])
+def robot_sample_rate():
+    """Change a robot's sampling rate (Hz), also while a mission runs"""
+    river = request.args.get('river', 'river1')
+    return jsonify(rc.set_sample_rate_api(river, request.args.get('rate', type=float)))
 
 @app.route('/api/robot/stop', methods=['POST'])
 def stop_robot():
@@ -1124,27 +1269,62 @@ def stop_robot():
 @app.route('/api/robot/status', methods=['GET'])
 def robot_status():
     river = request.args.get('river', 'river1')
-    return jsonify(rc.get_robot_status(river))
+    if river not in rc.robots:
+        return jsonify(rc.get_robot_status(river))
+    return conditional_json(rc.robots[river].status_etag(), lambda: rc.get_robot_status(river))
 
 @app.route('/api/water-quality/latest', methods=['GET'])
 def latest():
     river = request.args.get('river', 'river1')
-    data = load_river_data(river)
-    if not data:
-        return jsonify({"status": "success", "count": 0, "data": []})
-    latest_data = data[-20:] if len(data) >= 20 else data
-    return jsonify({"status": "success", "count": len(latest_data), "total": len(data), "data": latest_data})
+    
+    def build():
+        readings = get_readings(river)
+        latest_data = readings[-20:]
+        if not latest_data:
+            return {"status": "success", "count": 0, "cursor": readings.last_seq, "data": []}
+        return {"status": "success", "count": len(latest_data), "total": readings.total_count,
+                "cursor": latest_data[-1]['seq'], "data": latest_data}
+    
+    return conditional_json(data_etag(river), build)
 
-@app.route('/api/dashboard/summary', methods=['GET'])
-def summary():
+@app.route('/api/water-quality/since', methods=['GET'])
+def since():
+    """
+    Readings newer than `cursor` (a seq from a previous response)
+    wait=N long-polls up to N seconds when there is nothing new yet
+    """
     river = request.args.get('river', 'river1')
-    data = load_river_data(river)
-    if not data:
-        return jsonify({"status": "success", "current": None, "statistics": {"total_readings": 0}})
-    latest = data[-1]
-    recent = data[-50:] if len(data) >= 50 else data
-    avg_quality = sum(d['water_quality']['score'] for d in recent) / len(recent)
-    return jsonify({
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), MAX_LONG_POLL)
+    
+    deadline = time.monotonic() + wait
+    readings = get_readings(river)
+    while readings.last_seq <= cursor:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        robot = rc.robots.get_loaded(river)
+        if robot and readings is robot.all_data:
+            readings.wait_for(cursor, remaining)
+        else:
+            # No loaded robot to notify us: re-check the files
+            time.sleep(min(0.5, remaining))
+            readings = get_readings(river)
+    
+    data, more = readings.since(cursor, limit)
+    next_cursor = data[-1]['seq'] if data else max(cursor, 0)
+    return jsonify({"status": "success", "count": len(data), "cursor": next_cursor,
+                    "more": more, "data": data})
+
+def build_summary(readings):
+    """Dashboard summary from a ReadingStore (O(1))"""
+    recent = readings[-1:]
+    if not recent:
+        return {"status": "success", "current": None, "statistics": {"total_readings": 0}}
+    latest = recent[-1]
+    avg_quality = readings.aggregates.window_mean('score')
+    return {
         "status": "success",
         "current": {
             "quality_score": latest['water_quality']['score'],
@@ -1154,8 +1334,241 @@ def summary():
             "temperature": latest['sensor_readings']['temperature'],
             "TDS": latest['sensor_readings']['TDS']
         },
-        "statistics": {"average_quality_score": round(avg_quality, 2), "total_readings": len(data)}
-    })
+        "statistics": {"average_quality_score": round(avg_quality, 2), "total_readings": readings.total_count}
+    }
+
+@app.route('/api/dashboard/summary', methods=['GET'])
+def summary():
+    river = request.args.get('river', 'river1')
+    return conditional_json(data_etag(river), lambda: build_summary(get_readings(river)))
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """Server-Sent Events: a snapshot on connect, then each new reading and status change"""
+    river = request.args.get('river', 'river1')
+    if river not in rc.robots:
+        return jsonify({"error": "River not found"}), 404
+    
+    robot = rc.robots[river]
+    # Subscribe before taking the snapshot so nothing falls in between
+    sub = robot.events.subscribe()
+    snapshot = {
+        "status": robot.get_status(),
+        "summary": build_summary(robot.all_data),
+        "latest": robot.all_data[-20:]
+    }
+    
+    def generate():
+        try:
+            yield sse_frame("snapshot", snapshot)
+            while True:
+                frame = sub.get(timeout=STREAM_KEEPALIVE)
+                yield frame if frame else ": keepalive\n\n"
+        finally:
+            sub.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ==================== FLEET ====================
+
+# Field name -> how to compute it; only requested fields are computed
+FLEET_SUMMARY_FIELDS = {
+    "robot_id": lambda robot: robot.robot_id,
+    "river_name": lambda robot: robot.river_name,
+    "is_running": lambda robot: robot.is_running,
+    "state": lambda robot: robot.state,
+    "mission_count": lambda robot: robot.mission_count,
+    "data_points": lambda robot: len(robot.all_data),
+    "total_readings": lambda robot: robot.all_data.total_count,
+    "cursor": lambda robot: robot.all_data.last_seq,
+    "waste_collected": lambda robot: round(robot.waste_collected, 2),
+    "waste_items": lambda robot: robot.all_data.aggregates.waste_items,
+    "waste_by_type": lambda robot: dict(robot.all_data.aggregates.waste_by_type),
+    "current": lambda robot: build_summary(robot.all_data)["current"],
+    "average_quality_score": lambda robot: round(robot.all_data.aggregates.window_mean('score'), 2),
+    "aggregates": lambda robot: robot.all_data.aggregates.to_dict(),
+}
+FLEET_SUMMARY_DEFAULT = [f for f in FLEET_SUMMARY_FIELDS if f != "aggregates"]
+
+def requested_fields(default):
+    """fields=a,b,c query parameter as a list (default when absent)"""
+    fields = request.args.get('fields')
+    if not fields:
+        return default
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
+def project(record, fields):
+    """Keep only `fields` of a reading; dotted paths pick nested keys (water_quality.score)"""
+    result = {}
+    for field in fields:
+        value = record
+        for key in field.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        target = result
+        parts = field.split('.')
+        for key in parts[:-1]:
+            target = target.setdefault(key, {})
+        target[parts[-1]] = value
+    return result
+
+def fleet_etag():
+    loaded = rc.robots.loaded()
+    return signature_etag((rc.robots.configs(),
+                           tuple((rid, loaded[rid].status_etag() if rid in loaded else data_etag(rid))
+                                 for rid in rc.robots.keys())))
+
+class IdleRobot:
+    """Read-only stand-in for a river whose robot is not loaded, backed by its stored snapshot"""
+    is_running = False
+    state = "IDLE"
+    
+    def __init__(self, river_id):
+        config = rc.robots.config(river_id)
+        self.robot_id = config["robot_id"]
+        self.river_name = config["river_name"]
+        self.all_data, self.waste_collected = cached_snapshot(get_storage(river_id))
+        missions = self.all_data.column("mission")
+        self.mission_count = int(missions.max()) if len(missions) else 0
+
+def fleet_robots_view():
+    """river_id -> loaded robot, or an IdleRobot for the rest (nothing gets built)"""
+    loaded = rc.robots.loaded()
+    view = {}
+    for river_id in rc.robots.keys():
+        if river_id in loaded:
+            view[river_id] = loaded[river_id]
+        else:
+            try:
+                view[river_id] = IdleRobot(river_id)
+            except KeyError:
+                continue  # removed meanwhile
+    return view
+
+@app.route('/api/fleet/summary', methods=['GET'])
+def fleet_summary():
+    """Status + summary for every robot in one response (fields= to project)"""
+    fields = requested_fields(FLEET_SUMMARY_DEFAULT)
+    unknown = [f for f in fields if f not in FLEET_SUMMARY_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}",
+                        "available": list(FLEET_SUMMARY_FIELDS)}), 400
+    
+    def build():
+        robots = fleet_robots_view()
+        rivers = {
+            river_id: {f: FLEET_SUMMARY_FIELDS[f](robot) for f in fields}
+            for river_id, robot in robots.items()
+        }
+        idle = [river_id for river_id, robot in robots.items() if isinstance(robot, IdleRobot)]
+        return {"status": "success", "count": len(rivers), "rivers": rivers, "idle": idle}
+    
+    return conditional_json(signature_etag((fleet_etag(), fields)), build)
+
+@app.route('/api/fleet/latest', methods=['GET'])
+def fleet_latest():
+    """Latest readings of every robot (limit=, fields= with dotted paths)"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    fields = requested_fields(None)
+    
+    def build():
+        rivers = {}
+        for river_id in rc.robots.keys():
+            readings = get_readings(river_id)[-limit:]
+            if fields:
+                readings = [project(r, fields) for r in readings]
+            rivers[river_id] = readings
+        return {"status": "success", "count": len(rivers), "rivers": rivers}
+    
+    return conditional_json(signature_etag((fleet_etag(), limit, fields)), build)
+
+@app.route('/api/fleet/robots', methods=['GET'])
+def fleet_robots():
+    """Configured rivers and which of them have a robot loaded"""
+    return jsonify({"status": "success", **rc.robots.get_stats()})
+
+@app.route('/api/fleet/robots', methods=['POST'])
+def fleet_add_robot():
+    """Add a river to the fleet: {"river": "river6", "river_name": ..., "robot_id": ...}"""
+    global river_names
+    data = request.json or {}
+    river_id = data.get('river')
+    if not river_id:
+        return jsonify({"status": "error", "message": "Missing river"}), 400
+    # data_file is not taken from the request: it is always robot_data_<river>.json
+    config = {k: data[k] for k in ("robot_id", "river_name", "sample_rate_hz", "aggregate_window") if data.get(k)}
+    try:
+        check_river_id(river_id)
+        if "sample_rate_hz" in config:
+            config["sample_rate_hz"] = rc.check_sample_rate(config["sample_rate_hz"])
+        if "aggregate_window" in config:
+            config["aggregate_window"] = rc.check_aggregate_window(config["aggregate_window"])
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    try:
+        config = rc.robots.add(river_id, **config)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    river_names[river_id] = config["river_name"]
+    save_river_names(river_names)
+    return jsonify({"status": "success", "river": river_id, "config": config})
+
+@app.route('/api/fleet/robots', methods=['DELETE'])
+def fleet_remove_robot():
+    """Remove a river from the fleet (stops its mission; stored readings are kept)"""
+    global river_names
+    river_id = request.args.get('river')
+    if river_id not in rc.robots:
+        return jsonify({"status": "error", "message": "River not found"}), 404
+    rc.robots.remove(river_id)
+    if river_names.pop(river_id, None) is not None:
+        save_river_names(river_names)
+    return jsonify({"status": "success", "message": f"{river_id} removed"})
+
+# ==================== QUALITY RULES ====================
+
+@app.route('/api/quality-rules', methods=['GET'])
+def quality_rules():
+    """Effective warning rules for a river and how often its stored readings break them"""
+    river = request.args.get('river', 'river1')
+    rules = get_rules(river)
+    
+    def build():
+        readings = get_readings(river)
+        cols = readings.columns(CHANNELS)
+        X = np.column_stack([cols[c] for c in CHANNELS])
+        return {"status": "success", "river": river, "readings": len(X),
+                "rules": rules.to_list(), "violations": rules.counts(X)}
+    
+    return conditional_json(signature_etag((data_etag(river), rules.messages)), build)
+
+# ==================== MODEL RETRAINING ====================
+
+retrainer = ModelRetrainer(lambda: [robot.all_data for robot in rc.robots.loaded().values()],
+                           interval=RETRAIN_INTERVAL)
+
+@app.route('/api/model', methods=['GET'])
+def model_status():
+    """Live model generation, background retraining and inference service stats"""
+    service = get_inference_service()
+    cache = get_shared_predictor().cache
+    return jsonify({"status": "success", **retrainer.get_stats(),
+                    "inference": service.get_stats() if service else None,
+                    "prediction_cache": cache.get_stats() if cache else None})
+
+@app.route('/api/model/retrain', methods=['POST'])
+def model_retrain():
+    """Queue a retraining pass now (runs in the background)"""
+    retrainer.start()
+    retrainer.retrain_now()
+    return jsonify({"status": "success", "message": "Retraining started"})
+
+# ==================== MISSION SCHEDULER ====================
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_status():
+    """Active missions and per-tick timing (lateness, duration, missed ticks)"""
+    return jsonify({"status": "success", **get_scheduler().get_stats()})
 
 if __name__ == "__main__":
     print("\n" + "="*70)
@@ -1168,4 +1581,6 @@ if __name__ == "__main__":
     print("   ✅ Confirmation modal")
     print("   ✅ Clears all data for river")
     print("\n" + "="*70 + "\n")
+    if RETRAIN_INTERVAL:
+        retrainer.start()
     app.run(debug=False, host='0.0.0.0', port=5000, use_reloader=False)
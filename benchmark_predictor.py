@@ -0,0 +1,235 @@
+# benchmark_predictor.py
+# Micro-benchmarks for the quality predictor, with baseline regression checks
+#
+#   python benchmark_predictor.py                        # run, write benchmark_results.json
+#   python benchmark_predictor.py --save-baseline base.json
+#   python benchmark_predictor.py --baseline base.json   # exit 1 on a slowdown
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+
+from quality_predictor import FEATURES, QualityPredictor
+from sensor_reader import SensorReader
+
+
+# ==================== TIMING ====================
+
+REPEATS = 5            # timing rounds per benchmark
+MIN_P99_SAMPLES = 1000  # fewer pooled samples than this: p99 is reported but never gated
+
+
+def measure(fn, iterations, warmup=10, rows=1, repeats=REPEATS):
+    """
+    Time `repeats` rounds of `iterations` calls of fn(); latencies in microseconds
+
+    p50 is the best round's median, which is stable against a noisy
+    neighbour or a CPU frequency change in one round. p99 is taken over
+    all rounds pooled, so it rests on repeats * iterations samples.
+    """
+    for _ in range(warmup):
+        fn()
+    rounds = []
+    for _ in range(repeats):
+        times = np.empty(iterations)
+        gc.collect()
+        gc.disable()
+        try:
+            for i in range(iterations):
+                start = time.perf_counter()
+                fn()
+                times[i] = time.perf_counter() - start
+        finally:
+            gc.enable()
+        rounds.append(times)
+    pooled = np.concatenate(rounds)
+    p50 = min(float(np.median(times)) for times in rounds)
+    p99 = float(np.percentile(pooled, 99))
+    mean = float(pooled.mean())
+    return {
+        "iterations": iterations,
+        "repeats": repeats,
+        "samples": len(pooled),
+        "p50_us": round(p50 * 1e6, 2),
+        "p99_us": round(p99 * 1e6, 2),
+        "mean_us": round(mean * 1e6, 2),
+        "ops_per_s": round(1 / mean, 1),
+        "rows_per_s": round(rows / mean, 1)
+    }
+
+
+def sample_inputs(n, seed=0):
+    """Sensor dicts from the simulator, plus the same rows as an (n, 4) array"""
+    random.seed(seed)
+    reader = SensorReader()
+    readings = [reader.read_all_sensors() for _ in range(n)]
+    X = np.array([[r[f] for f in FEATURES] for r in readings])
+    return readings, X
+
+
+def cycle(items):
+    state = {"i": 0}
+
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+
+# ==================== BENCHMARKS ====================
+
+def run_benchmarks(scale=1.0):
+    n = lambda base: max(5, int(base * scale))
+    predictor = QualityPredictor()
+    readings, X = sample_inputs(2000)
+    results = {}
+
+    next_reading = cycle(readings)
+    results["predict_quality"] = measure(lambda: predictor.predict_quality(next_reading()), n(2000))
+    results["get_quality_details"] = measure(lambda: predictor.get_quality_details(next_reading()), n(2000))
+
+    cached = QualityPredictor(auto_train=False, cache_size=256)
+    cached.install(predictor.model, predictor.scaler)
+    next_repeat = cycle(readings[:64])
+    results["predict_quality_cached"] = measure(lambda: cached.predict_quality(next_repeat()), n(2000))
+
+    for size in (100, 1000):
+        batch = X[:size]
+        results[f"predict_batch_{size}"] = measure(lambda: predictor.predict_batch(batch), n(200), rows=size)
+    results["get_quality_details_batch_1000"] = measure(
+        lambda: predictor.get_quality_details_batch(X[:1000]), n(50), rows=1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl = os.path.join(tmp, "model.pkl")
+        npz = os.path.join(tmp, "model.npz")
+        quiet(lambda: predictor.save_model(pkl))
+        quiet(lambda: predictor.export_npz(npz))
+        results["load_model_pickle"] = measure(
+            lambda: quiet(lambda: QualityPredictor(auto_train=False).load_model(pkl)), n(50), warmup=2)
+        results["load_model_npz"] = measure(
+            lambda: quiet(lambda: QualityPredictor(auto_train=False).load_npz(npz)), n(50), warmup=2)
+
+        results["cold_start_train"] = measure(lambda: quiet(QualityPredictor), n(20), warmup=1, repeats=3)
+        results["cold_start_process"] = measure(lambda: cold_process(npz), n(5), warmup=1, repeats=3)
+
+    return results
+
+
+def quiet(fn):
+    """Call fn with its prints suppressed (the predictor logs every load)"""
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return fn()
+        finally:
+            sys.stdout = stdout
+
+
+def cold_process(npz_path):
+    """Fresh interpreter: import, load the .npz and score one reading"""
+    code = (
+        "from quality_predictor import QualityPredictor;"
+        "p = QualityPredictor(auto_train=False);"
+        f"p.load_npz({npz_path!r});"
+        "p.predict_quality({'pH': 7.0, 'turbidity': 3.0, 'temperature': 24.0, 'TDS': 350.0})"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+# ==================== REPORTING ====================
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count()
+    }
+
+
+def print_results(results):
+    print(f"\n{'benchmark':34} {'p50 (us)':>12} {'p99 (us)':>12} {'ops/s':>12} {'rows/s':>14}")
+    print("-" * 88)
+    for name, r in results.items():
+        print(f"{name:34} {r['p50_us']:12.1f} {r['p99_us']:12.1f} {r['ops_per_s']:12.1f} {r['rows_per_s']:14.1f}")
+
+
+def compare(results, baseline, p50_tolerance, p99_tolerance=None):
+    """
+    Check every benchmark against the baseline
+    p99 is only gated when a tolerance is given and both runs pooled at
+    least MIN_P99_SAMPLES samples
+    Returns: list of regression messages (empty = pass)
+    """
+    regressions = []
+    print(f"\n{'benchmark':34} {'p50 vs base':>14} {'p99 vs base':>14}")
+    print("-" * 66)
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:34} {'(new)':>14}")
+            continue
+        p50_ratio = r["p50_us"] / base["p50_us"] if base["p50_us"] else 1.0
+        p99_ratio = r["p99_us"] / base["p99_us"] if base["p99_us"] else 1.0
+        gate_p99 = (p99_tolerance is not None
+                    and min(r.get("samples", 0), base.get("samples", 0)) >= MIN_P99_SAMPLES)
+        failed = p50_ratio > 1 + p50_tolerance or (gate_p99 and p99_ratio > 1 + p99_tolerance)
+        mark = "❌" if failed else "✅"
+        print(f"{name:34} {p50_ratio:13.2f}x {p99_ratio:13.2f}x {mark}")
+        if failed:
+            regressions.append(f"{name}: p50 {r['p50_us']:.1f}us vs {base['p50_us']:.1f}us, "
+                               f"p99 {r['p99_us']:.1f}us vs {base['p99_us']:.1f}us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quality predictor micro-benchmarks")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write results")
+    parser.add_argument("--baseline", help="results file to compare against (exit 1 on regression)")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--p50-tolerance", type=float, default=0.25, help="allowed p50 slowdown (0.25 = +25%%)")
+    parser.add_argument("--p99-tolerance", type=float, default=None,
+                        help=f"also gate p99 (needs >= {MIN_P99_SAMPLES} samples per benchmark); off by default")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations (smoke run)")
+    args = parser.parse_args()
+
+    print("\n=== QUALITY PREDICTOR BENCHMARKS ===")
+    results = quiet(lambda: run_benchmarks(scale=0.1 if args.quick else 1.0))
+    print_results(results)
+
+    report = {"environment": environment(), "results": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.p50_tolerance, args.p99_tolerance)
+        if regressions:
+            print("\n❌ PERFORMANCE REGRESSION")
+            for message in regressions:
+                print(f"  - {message}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+# conftest.py
+# pytest setup: repo root on sys.path (flat modules), skip the manual API script
+
+collect_ignore = ["test_api.py"]
@@ -0,0 +1,862 @@
+# data_storage.py
+# Storage backends for robot readings (JSON log / SQLite) and background writer
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from reading_store import ReadingStore
+
+STORAGE_BACKEND = os.environ.get("AQUATIC_STORAGE", "json")
+SQLITE_FILE = os.environ.get("AQUATIC_DB", "aquatic_robot.db")
+
+
+def river_key(data_file):
+    """robot_data_river1.json -> river1"""
+    name = os.path.splitext(os.path.basename(data_file))[0]
+    return name[len("robot_data_"):] if name.startswith("robot_data_") else name
+
+
+def open_storage(data_file, backend=None):
+    """
+    Storage backend for one river
+
+    Both backends expose the same interface:
+    - writes  : load_recent, append_many, needs_compaction, compact, clear, close
+    - queries : count, latest, first, total_waste, average, averages,
+                waste_items, readings
+    """
+    backend = backend or STORAGE_BACKEND
+    if backend == "sqlite":
+        return SQLiteStorage(SQLITE_FILE, river_key(data_file), json_file=data_file)
+    if backend == "json":
+        return ReadingLog(data_file)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def file_signature(*paths):
+    """(mtime, size) of each file; changes whenever any of them is written"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+_snapshot_cache = {}
+_snapshot_lock = threading.Lock()
+
+
+def cached_snapshot(storage, limit=1000):
+    """
+    (ReadingStore of the most recent readings, total_waste) for a backend
+    whose robot is not running in this process. Files are only parsed
+    again when their mtime/size signature changes.
+    """
+    signature = storage.signature()
+    with _snapshot_lock:
+        hit = _snapshot_cache.get(storage.cache_key)
+    if hit and hit[0] == signature:
+        return hit[1]
+
+    snapshot = storage.snapshot(limit)
+    with _snapshot_lock:
+        _snapshot_cache[storage.cache_key] = (signature, snapshot)
+    return snapshot
+
+
+# ==================== JSON LOG BACKEND ====================
+
+class ReadingLog:
+    """
+    Append-only storage for robot readings
+
+    Files:
+    - robot_data_riverN.json  : compacted snapshot {readings, total_waste, last_update}
+    - robot_data_riverN.jsonl : one JSON reading per line, appended on every save
+
+    A save only writes the new record to the .jsonl tail. Every
+    `compact_every` records the snapshot is rewritten from the caller's
+    in-memory data and the tail is truncated.
+    """
+
+    def __init__(self, data_file, max_readings=1000, compact_every=200):
+        self.data_file = data_file
+        self.log_file = os.path.splitext(data_file)[0] + ".jsonl"
+        self.spill_file = self.log_file + ".spill"
+        self.cache_key = os.path.abspath(data_file)
+        self.max_readings = max_readings
+        self.compact_every = compact_every
+
+        self.generation = 0
+        self.pending = 0
+        self._fh = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load snapshot and replay the log tail, resuming appends after it
+        Returns: (readings, total_waste)
+        """
+        readings, total_waste, self.generation, self.pending = self._read()
+        return readings, total_waste
+
+    def _read(self):
+        """Parse snapshot + tail without touching the writer state"""
+        readings = []
+        total_waste = 0
+        generation = 0
+
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                file_data = json.load(f)
+
+            # Handle both old and new format
+            if isinstance(file_data, dict):
+                readings = file_data.get('readings', [])
+                total_waste = file_data.get('total_waste', 0)
+                generation = file_data.get('generation', 0)
+            elif isinstance(file_data, list):
+                readings = file_data
+                total_waste = sum(d.get('waste', {}).get('weight', 0) for d in file_data)
+
+        tail = self._read_tail(generation)
+        for record in tail:
+            readings.append(record)
+            total_waste += record.get('waste', {}).get('weight', 0)
+
+        if len(readings) > self.max_readings:
+            readings = readings[-self.max_readings:]
+
+        return readings, total_waste, generation, len(tail)
+
+    def load_recent(self, limit=1000):
+        readings, total_waste = self.load()
+        return readings[-limit:], total_waste
+
+    def _read_tail(self, generation):
+        """Read log records belonging to the given snapshot generation"""
+        if not os.path.exists(self.log_file):
+            return []
+
+        records = []
+        with open(self.log_file, 'r') as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get('generation') != generation:
+                    # Already folded into the snapshot (crash during compaction)
+                    return []
+            except (ValueError, AttributeError):
+                return []
+
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn line from an interrupted write
+                    continue
+        return records
+
+    def append(self, record):
+        """Append one reading to the log tail"""
+        self.append_many([record])
+
+    def append_many(self, records, fsync=False):
+        """Append several readings with a single write"""
+        if not records:
+            return
+        lines = "".join(json.dumps(r) + "\n" for r in records)
+        with self._lock:
+            if self._fh is None:
+                self._open_log()
+            self._fh.write(lines)
+            self._fh.flush()
+            if fsync:
+                os.fsync(self._fh.fileno())
+            self.pending += len(records)
+
+    def needs_compaction(self):
+        return self.pending >= self.compact_every
+
+    def compact(self, readings, total_waste):
+        """Rewrite the snapshot from in-memory data and truncate the log"""
+        with self._lock:
+            self.generation += 1
+            save_data = {
+                'readings': list(readings)[-self.max_readings:],
+                'total_waste': total_waste,
+                'last_update': datetime.now().isoformat(),
+                'generation': self.generation
+            }
+
+            tmp_file = self.data_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(save_data, f)
+            os.replace(tmp_file, self.data_file)
+
+            self._close_log()
+            self._open_log(truncate=True)
+            self.pending = 0
+
+    def clear(self):
+        """Delete snapshot and log"""
+        with self._lock:
+            self._close_log()
+            for path in (self.data_file, self.log_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.generation = 0
+            self.pending = 0
+
+    def close(self):
+        with self._lock:
+            self._close_log()
+
+    # ---------- queries (capped at max_readings) ----------
+
+    def signature(self):
+        return file_signature(self.data_file, self.log_file)
+
+    def snapshot(self, limit=1000):
+        readings, total_waste, _, _ = self._read()
+        store = ReadingStore.from_records(readings[-limit:])
+        store.total_count = len(readings)
+        return store, total_waste
+
+    def _view(self):
+        return cached_snapshot(self, self.max_readings)
+
+    def count(self):
+        return len(self._view()[0])
+
+    def latest(self, limit=20):
+        return self._view()[0][-limit:]
+
+    def first(self):
+        view = self._view()[0]
+        return view[0] if view else None
+
+    def total_waste(self):
+        return self._view()[1]
+
+    def average(self, name, last=None):
+        return self._view()[0].mean(name, last)
+
+    def averages(self, names=ReadingStore.SENSORS + ("score",)):
+        view = self._view()[0]
+        return {name: view.mean(name) for name in names}
+
+    def waste_items(self, limit=None):
+        view = self._view()[0]
+        return view.where(view.column('waste_detected'))[:limit]
+
+    def readings(self, mission=None, start=None, end=None):
+        view = self._view()[0]
+        return iter(view.where(view.mask(mission=mission, start=start, end=end)))
+
+    def _open_log(self, truncate=False):
+        if not truncate and self._log_generation() == self.generation:
+            self._fh = open(self.log_file, 'a')
+            return
+        self._fh = open(self.log_file, 'w')
+        self._fh.write(json.dumps({'generation': self.generation}) + "\n")
+        self._fh.flush()
+
+    def _log_generation(self):
+        """Generation stamped in the log header, None if missing"""
+        try:
+            with open(self.log_file, 'r') as f:
+                return json.loads(f.readline()).get('generation')
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _close_log(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+# ==================== SQLITE BACKEND ====================
+
+class SQLiteStorage:
+    """
+    SQLite storage for one river (all rivers share one database file)
+
+    WAL mode lets the Flask threads read while the writer thread commits.
+    History is unbounded; queries use the (river, timestamp) and
+    (river, mission) indexes instead of parsing whole files. "Latest"
+    means highest seq (the (river, seq) index), not latest timestamp:
+    replayed missions on a simulated clock can carry timestamps out of
+    write order.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            river TEXT NOT NULL,
+            seq INTEGER,
+            robot_id TEXT,
+            river_name TEXT,
+            timestamp TEXT NOT NULL,
+            mission INTEGER,
+            state TEXT,
+            ph REAL,
+            turbidity REAL,
+            temperature REAL,
+            tds REAL,
+            score REAL,
+            status TEXT,
+            warnings TEXT,
+            anomalies TEXT,
+            waste_detected INTEGER,
+            waste_type TEXT,
+            waste_weight REAL,
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_readings_river_ts ON readings (river, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_readings_river_mission ON readings (river, mission);
+        CREATE TABLE IF NOT EXISTS river_meta (
+            river TEXT PRIMARY KEY,
+            waste_offset REAL NOT NULL DEFAULT 0
+        );
+    """
+
+    # ReadingStore column name -> SQL column
+    SQL_COLUMNS = {
+        "pH": "ph",
+        "turbidity": "turbidity",
+        "temperature": "temperature",
+        "TDS": "tds",
+        "score": "score",
+        "waste_weight": "waste_weight",
+        "mission": "mission",
+    }
+
+    INSERT = """
+        INSERT INTO readings (river, seq, robot_id, river_name, timestamp, mission, state,
+                              ph, turbidity, temperature, tds, score, status, warnings, anomalies,
+                              waste_detected, waste_type, waste_weight, extra)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    # One importer at a time, so two handles on a new river can't both import
+    _import_lock = threading.Lock()
+
+    def __init__(self, db_file, river, json_file=None):
+        self.db_file = db_file
+        self.river = river
+        self.json_file = json_file
+        self.spill_file = f"{db_file}.{river}.spill"
+        self.cache_key = f"{os.path.abspath(db_file)}:{river}"
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+        self._migrate()
+        # Import on open (not when a robot is built) so idle rivers have their data
+        with self._import_lock:
+            if self.count() == 0:
+                self._import_json()
+
+    def _migrate(self):
+        """Add columns introduced after a database was created"""
+        conn = self._conn()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(readings)")}
+        if "anomalies" not in columns:
+            conn.execute("ALTER TABLE readings ADD COLUMN anomalies TEXT")
+            conn.commit()
+        if "seq" not in columns:
+            # Older rows never stored seq: number them per river in insert order
+            with conn:
+                conn.execute("ALTER TABLE readings ADD COLUMN seq INTEGER")
+                ids = conn.execute("SELECT id, river FROM readings ORDER BY id").fetchall()
+                counters = {}
+                updates = []
+                for row in ids:
+                    counters[row["river"]] = counters.get(row["river"], 0) + 1
+                    updates.append((counters[row["river"]], row["id"]))
+                conn.executemany("UPDATE readings SET seq = ? WHERE id = ?", updates)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_river_seq ON readings (river, seq)")
+        conn.commit()
+
+    def _conn(self):
+        """One connection per thread (writer thread, each Flask worker)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- writes ----------
+
+    def load_recent(self, limit=1000):
+        """Last `limit` readings for the in-memory buffer, plus total waste"""
+        return self.latest(limit), self.total_waste()
+
+    def _import_json(self):
+        """One-time migration of an existing JSON snapshot + log"""
+        if not self.json_file:
+            return
+        log = ReadingLog(self.json_file)
+        if not os.path.exists(log.data_file) and not os.path.exists(log.log_file):
+            return
+        readings, total_waste = log.load()
+        self.append_many(readings)
+        offset = total_waste - sum(r.get('waste', {}).get('weight', 0) or 0 for r in readings)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO river_meta (river, waste_offset) VALUES (?, ?)",
+                (self.river, offset)
+            )
+        print(f"✓ Imported {len(readings)} readings for {self.river} into {self.db_file}")
+
+    def append_many(self, records, fsync=False):
+        if not records:
+            return
+        conn = self._conn()
+        if any(not r.get('seq') for r in records):
+            # Records from files that predate seq: continue this river's numbering
+            last = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM readings WHERE river = ?",
+                                (self.river,)).fetchone()[0]
+            numbered = []
+            for r in records:
+                seq = r.get('seq') or last + 1
+                last = max(last, seq)
+                numbered.append(dict(r, seq=seq))
+            records = numbered
+        if fsync:
+            conn.execute("PRAGMA synchronous=FULL")
+        with conn:
+            conn.executemany(self.INSERT, [self._to_row(r) for r in records])
+        if fsync:
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, readings, total_waste):
+        pass
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM readings WHERE river = ?", (self.river,))
+            conn.execute("DELETE FROM river_meta WHERE river = ?", (self.river,))
+        # Don't re-import the old JSON files after a reset
+        if self.json_file:
+            ReadingLog(self.json_file).clear()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _to_row(self, r):
+        sensors = r.get('sensor_readings', {})
+        quality = r.get('water_quality', {})
+        waste = r.get('waste', {})
+        extra = {k: v for k, v in r.items() if k not in ReadingStore.KNOWN_KEYS}
+        return (
+            self.river, r.get('seq'), r.get('robot_id'), r.get('river_name'), r.get('timestamp'),
+            r.get('mission'), r.get('state'),
+            sensors.get('pH'), sensors.get('turbidity'), sensors.get('temperature'), sensors.get('TDS'),
+            quality.get('score'), quality.get('status'), json.dumps(quality.get('warnings', [])),
+            json.dumps(quality.get('anomalies', [])),
+            1 if waste.get('detected') else 0, waste.get('type'), waste.get('weight', 0),
+            json.dumps(extra) if extra else None
+        )
+
+    @staticmethod
+    def _to_dict(row):
+        record = {
+            "seq": row["seq"],
+            "robot_id": row["robot_id"],
+            "river_name": row["river_name"],
+            "timestamp": row["timestamp"],
+            "mission": row["mission"],
+            "state": row["state"],
+            "sensor_readings": {
+                "pH": row["ph"],
+                "turbidity": row["turbidity"],
+                "temperature": row["temperature"],
+                "TDS": row["tds"]
+            },
+            "water_quality": {
+                "score": row["score"],
+                "status": row["status"],
+                "warnings": json.loads(row["warnings"] or "[]"),
+                "anomalies": json.loads(row["anomalies"] or "[]")
+            },
+            "waste": {
+                "detected": bool(row["waste_detected"]),
+                "type": row["waste_type"],
+                "weight": row["waste_weight"]
+            }
+        }
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        return record
+
+    # ---------- queries ----------
+
+    def signature(self):
+        return file_signature(self.db_file, self.db_file + "-wal")
+
+    def snapshot(self, limit=1000):
+        store = ReadingStore.from_records(self.latest(limit))
+        store.total_count = self.count()
+        return store, self.total_waste()
+
+    def count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM readings WHERE river = ?", (self.river,)
+        ).fetchone()[0]
+
+    def latest(self, limit=20):
+        rows = self._conn().execute(
+            "SELECT * FROM readings WHERE river = ? ORDER BY seq DESC, id DESC LIMIT ?",
+            (self.river, limit)
+        ).fetchall()
+        return [self._to_dict(row) for row in reversed(rows)]
+
+    def first(self):
+        row = self._conn().execute(
+            "SELECT * FROM readings WHERE river = ? ORDER BY seq, id LIMIT 1",
+            (self.river,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def total_waste(self):
+        conn = self._conn()
+        total = conn.execute(
+            "SELECT COALESCE(SUM(waste_weight), 0) FROM readings WHERE river = ?", (self.river,)
+        ).fetchone()[0]
+        offset = conn.execute(
+            "SELECT waste_offset FROM river_meta WHERE river = ?", (self.river,)
+        ).fetchone()
+        return total + (offset[0] if offset else 0)
+
+    def average(self, name, last=None):
+        col = self.SQL_COLUMNS[name]
+        if last is None:
+            sql = f"SELECT AVG({col}) FROM readings WHERE river = ?"
+            params = (self.river,)
+        else:
+            sql = (f"SELECT AVG({col}) FROM (SELECT {col} FROM readings WHERE river = ? "
+                   f"ORDER BY seq DESC, id DESC LIMIT ?)")
+            params = (self.river, last)
+        value = self._conn().execute(sql, params).fetchone()[0]
+        return value if value is not None else 0.0
+
+    def averages(self, names=ReadingStore.SENSORS + ("score",)):
+        cols = ", ".join(f"AVG({self.SQL_COLUMNS[n]})" for n in names)
+        row = self._conn().execute(
+            f"SELECT {cols} FROM readings WHERE river = ?", (self.river,)
+        ).fetchone()
+        return {name: (value if value is not None else 0.0) for name, value in zip(names, row)}
+
+    def waste_items(self, limit=None):
+        rows = self._conn().execute(
+            "SELECT * FROM readings WHERE river = ? AND waste_detected = 1 "
+            "ORDER BY timestamp, id LIMIT ?",
+            (self.river, -1 if limit is None else limit)
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def readings(self, mission=None, start=None, end=None):
+        """Lazily iterate readings in time order (indexed range query)"""
+        sql = "SELECT * FROM readings WHERE river = ?"
+        params = [self.river]
+        if mission is not None:
+            sql += " AND mission = ?"
+            params.append(int(mission))
+        if start is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end)
+        sql += " ORDER BY timestamp, id"
+        for row in self._conn().execute(sql, params):
+            yield self._to_dict(row)
+
+
+# ==================== BACKGROUND WRITER ====================
+
+class _Compaction:
+    """Queue marker: snapshot taken on the mission thread at this position"""
+
+    def __init__(self, readings, total_waste):
+        self.readings = readings
+        self.total_waste = total_waste
+
+
+class BackgroundWriter:
+    """
+    Group-commit writer thread for a storage backend
+
+    The mission loop only queues readings; this thread writes them in
+    batches of up to `batch_size`, at most `flush_interval` seconds after
+    the first reading of a batch arrived.
+
+    fsync: "never", "batch" (after every batch) or "periodic" (at most
+    once every `fsync_interval` seconds)
+
+    backpressure when `max_queue` readings are waiting:
+    - "block"       : submit() waits for the writer to catch up
+    - "drop_oldest" : the oldest queued reading is discarded
+    - "spill"       : readings overflow to a .spill file, merged back in order
+    """
+
+    FSYNC_POLICIES = ("never", "batch", "periodic")
+    BACKPRESSURE_POLICIES = ("block", "drop_oldest", "spill")
+
+    def __init__(self, storage, max_queue=1000, batch_size=100, flush_interval=0.5,
+                 fsync="never", fsync_interval=5.0, backpressure="block"):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        if backpressure not in self.BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+
+        self.storage = storage
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.backpressure = backpressure
+        self.spill_file = storage.spill_file
+        self.merge_file = f"{self.spill_file}.merging"
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._in_flight = 0
+        self._flush_requested = False
+        self._compaction_pending = False
+        self._closed = False
+        self._spill_fh = None
+        self._spilling = os.path.exists(self.spill_file) or os.path.exists(self.merge_file)
+        self._last_fsync = time.monotonic()
+
+        self.stats = {
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "max_queue_depth": 0
+        }
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---------- producer side (mission thread) ----------
+
+    def submit(self, record):
+        """Queue one reading for writing"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Writer is closed")
+
+            if self._spilling:
+                self._spill(record)
+                return
+
+            if len(self._queue) >= self.max_queue:
+                if self.backpressure == "block":
+                    while len(self._queue) >= self.max_queue and not self._closed:
+                        self._cond.wait()
+                elif self.backpressure == "drop_oldest":
+                    self._drop_oldest()
+                else:
+                    self._spilling = True
+                    self._spill(record)
+                    self._cond.notify_all()
+                    return
+
+            self._queue.append(record)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self._queue))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def wants_compaction(self):
+        return self.storage.needs_compaction() and not self._compaction_pending and not self._spilling
+
+    def request_compaction(self, readings, total_waste):
+        """Queue a snapshot; everything queued before it is part of it"""
+        with self._cond:
+            if self._spilling:
+                return False
+            self._queue.append(_Compaction(list(readings), total_waste))
+            self._compaction_pending = True
+            return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is on disk"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._queue or self._spilling or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def clear(self):
+        """Discard queued readings and delete the log files"""
+        with self._io_lock:
+            with self._cond:
+                self._queue.clear()
+                self._compaction_pending = False
+                self._spilling = False
+                self._close_spill()
+                for path in (self.spill_file, self.merge_file):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._cond.notify_all()
+            self.storage.clear()
+
+    def close(self, timeout=5.0):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            self._close_spill()
+        self.storage.close()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["queue_depth"] = len(self._queue)
+            stats["spilling"] = self._spilling
+        return stats
+
+    def _drop_oldest(self):
+        for i, item in enumerate(self._queue):
+            if not isinstance(item, _Compaction):
+                del self._queue[i]
+                self.stats["dropped"] += 1
+                return
+
+    def _spill(self, record):
+        # Kept open while spilling: submit() must not pay an open/close per reading
+        if self._spill_fh is None:
+            self._spill_fh = open(self.spill_file, 'a')
+        self._spill_fh.write(json.dumps(record) + "\n")
+        self._spill_fh.flush()
+        self.stats["spilled"] += 1
+
+    def _close_spill(self):
+        if self._spill_fh is not None:
+            self._spill_fh.close()
+            self._spill_fh = None
+
+    # ---------- writer thread ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._spilling and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._queue and not self._spilling:
+                    return
+
+                # Group commit: let the batch fill up for at most flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._queue) < self.batch_size and not self._flush_requested
+                       and not self._closed and not self._spilling):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = []
+                while self._queue and len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+                merge_spill = self._spilling and not self._queue
+                self._in_flight = len(batch) + (1 if merge_spill else 0)
+                if not self._queue:
+                    self._flush_requested = False
+                self._cond.notify_all()
+
+            try:
+                with self._io_lock:
+                    self._write(batch)
+                    if merge_spill:
+                        self._merge_spill()
+            except Exception as e:
+                print(f"  ❌ Writer error: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        records = []
+        for item in batch:
+            if isinstance(item, _Compaction):
+                self._append(records)
+                records = []
+                self.storage.compact(item.readings, item.total_waste)
+                self._compaction_pending = False
+            else:
+                records.append(item)
+        self._append(records)
+
+    def _append(self, records):
+        if not records:
+            return
+        now = time.monotonic()
+        fsync = self.fsync == "batch" or (
+            self.fsync == "periodic" and now - self._last_fsync >= self.fsync_interval
+        )
+        self.storage.append_many(records, fsync=fsync)
+        if fsync:
+            self._last_fsync = now
+        self.stats["written"] += len(records)
+        self.stats["batches"] += 1
+
+    def _merge_spill(self):
+        """
+        Move spilled readings into the log, then resume queueing
+
+        The spill file is renamed aside under the lock and merged outside
+        it, so submit() keeps spilling to a fresh file meanwhile; those
+        readings are merged on the next pass, which keeps them in order.
+        """
+        with self._cond:
+            self._close_spill()
+            # A .merging file left by a crash is merged before the newer spill file
+            if os.path.exists(self.spill_file) and not os.path.exists(self.merge_file):
+                os.replace(self.spill_file, self.merge_file)
+
+        records = []
+        if os.path.exists(self.merge_file):
+            with open(self.merge_file, 'r') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        self._append(records)
+        if os.path.exists(self.merge_file):
+            os.remove(self.merge_file)
+
+        with self._cond:
+            if not os.path.exists(self.spill_file):
+                self._spilling = False
+            self._cond.notify_all()
@@ -0,0 +1,157 @@
+# edge_aggregator.py
+# On-robot downsampling: per-window summaries instead of every raw reading
+
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from quality_predictor import STATUS_LABELS
+from quality_rules import CHANNELS
+
+# Lower rank = worse status ("Very Poor" is 0)
+STATUS_RANK = {label: rank for rank, label in enumerate(STATUS_LABELS.tolist())}
+
+
+class EdgeAggregator:
+    """
+    Rolls a robot's readings into one summary record per time window
+
+    A summary looks like a normal reading (channel means, mean score,
+    worst status, merged warnings), so storage, reports and the dashboard
+    handle it unchanged; the extra "summary" key carries count, min/max
+    per channel and the window bounds.
+
+    Readings that trip a rule (`raw_on_warning`) or the anomaly detector
+    are also passed through raw, so nothing interesting is averaged
+    away. They still count in the window's statistics, but their waste
+    and anomalies stay on the raw record only, so totals are not
+    counted twice.
+
+    Windows follow the readings' own timestamps; add() returns the
+    records to persist (raw trips now, a summary when a window closes).
+    """
+
+    def __init__(self, window_seconds=10.0, raw_on_warning=True):
+        self.window = timedelta(seconds=window_seconds)
+        self.raw_on_warning = raw_on_warning
+        self._lock = threading.Lock()
+        self.stats = {"readings": 0, "summaries": 0, "raw_kept": 0}
+        self._reset()
+
+    def _reset(self):
+        self._first = None
+        self._last = None
+        self._count = 0
+        self._raw = 0
+        self._sums = dict.fromkeys(CHANNELS + ("score",), 0.0)
+        self._mins = {}
+        self._maxs = {}
+        self._status = None
+        self._warnings = {}
+        self._anomalies = {}
+        self._waste_weight = 0.0
+        self._waste_types = Counter()
+
+    def add(self, record):
+        """Fold one raw reading in; returns the list of records to persist"""
+        out = []
+        with self._lock:
+            timestamp = datetime.fromisoformat(record["timestamp"])
+            if self._first is not None and timestamp - self._first >= self.window:
+                out.append(self._summary())
+                self._reset()
+
+            quality = record["water_quality"]
+            keep_raw = bool(quality.get("anomalies")) or (self.raw_on_warning and bool(quality.get("warnings")))
+            self._fold(record, timestamp, keep_raw)
+            self.stats["readings"] += 1
+            if keep_raw:
+                self.stats["raw_kept"] += 1
+                out.append(record)
+        return out
+
+    def flush(self):
+        """Summary of the open window (mission end), or None if it is empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            summary = self._summary()
+            self._reset()
+            return summary
+
+    def clear(self):
+        """Drop the open window without storing it"""
+        with self._lock:
+            self._reset()
+
+    def _fold(self, record, timestamp, keep_raw):
+        if self._first is None:
+            self._first = timestamp
+        self._last = record
+        self._count += 1
+
+        values = dict(record["sensor_readings"], score=record["water_quality"]["score"])
+        for name, total in self._sums.items():
+            value = values[name]
+            self._sums[name] = total + value
+            if name not in self._mins or value < self._mins[name]:
+                self._mins[name] = value
+            if name not in self._maxs or value > self._maxs[name]:
+                self._maxs[name] = value
+
+        quality = record["water_quality"]
+        status = quality.get("status")
+        if status is not None and (self._status is None
+                                   or STATUS_RANK.get(status, -1) < STATUS_RANK.get(self._status, -1)):
+            self._status = status
+        for warning in quality.get("warnings", []):
+            self._warnings[warning] = None
+
+        if keep_raw:
+            self._raw += 1
+            return
+        for name in quality.get("anomalies", []):
+            self._anomalies[name] = None
+        waste = record.get("waste", {})
+        if waste.get("detected"):
+            self._waste_weight += waste.get("weight", 0) or 0
+            self._waste_types[waste.get("type") or "unknown"] += 1
+
+    def _summary(self):
+        last = self._last
+        n = self._count
+        means = {name: round(total / n, 2) for name, total in self._sums.items()}
+        self.stats["summaries"] += 1
+        return {
+            "robot_id": last.get("robot_id"),
+            "river_name": last.get("river_name"),
+            "timestamp": last["timestamp"],
+            "mission": last.get("mission"),
+            "state": last.get("state"),
+            "sensor_readings": {name: means[name] for name in CHANNELS},
+            "water_quality": {
+                "score": means["score"],
+                "status": self._status,
+                "warnings": list(self._warnings),
+                "anomalies": list(self._anomalies)
+            },
+            "waste": {
+                "detected": bool(self._waste_types),
+                "type": self._waste_types.most_common(1)[0][0] if self._waste_types else None,
+                "weight": round(self._waste_weight, 4)
+            },
+            "summary": {
+                "count": n,
+                "raw_kept": self._raw,
+                "window_start": self._first.isoformat(),
+                "window_end": last["timestamp"],
+                "min": dict(self._mins),
+                "max": dict(self._maxs),
+                "waste_by_type": dict(self._waste_types)
+            }
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, window_seconds=self.window.total_seconds(),
+                        pending=self._count, raw_on_warning=self.raw_on_warning)
@@ -0,0 +1,77 @@
+# event_bus.py
+# In-process publish/subscribe for live robot events (feeds the SSE stream)
+
+import json
+import threading
+from collections import deque
+
+
+def sse_frame(event_type, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Subscription:
+    """
+    One listener's bounded queue of SSE frames
+    A slow client loses its oldest frames instead of holding up the robot.
+    """
+
+    def __init__(self, bus, max_pending=100):
+        self._bus = bus
+        self._frames = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def push(self, frame):
+        with self._cond:
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next frame, or None after `timeout` seconds without events"""
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            return self._frames.popleft() if self._frames else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    Fan-out of robot events to any number of subscribers
+    Each event is serialized once, no matter how many clients listen.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, max_pending=100):
+        sub = Subscription(self, max_pending)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event_type, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        frame = sse_frame(event_type, data)
+        for sub in subscribers:
+            sub.push(frame)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
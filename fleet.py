@@ -0,0 +1,214 @@
+# fleet.py
+# Registry of the robot fleet; robots are built on first access
+
+import json
+import os
+import re
+import threading
+
+# Optional JSON file: {"river6": {"robot_id": "robot-006", "river_name": "River 6", "sample_rate_hz": 5,
+#                                "aggregate_window": 10}}
+FLEET_FILE = os.environ.get("AQUATIC_FLEET", "fleet.json")
+
+# River ids end up in file names (robot_data_<river>.json)
+RIVER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+DEFAULT_FLEET = {
+    f"river{i}": {"robot_id": f"robot-{i:03d}", "river_name": f"River {i}",
+                  "data_file": f"robot_data_river{i}.json"}
+    for i in range(1, 6)
+}
+
+
+def check_river_id(river_id):
+    if not isinstance(river_id, str) or not RIVER_ID_PATTERN.match(river_id):
+        raise ValueError("River id may only contain letters, digits, '_' and '-'")
+    return river_id
+
+
+class FleetRegistry:
+    """
+    river_id -> robot, created (and its history loaded) on first access
+
+    Behaves like the dict it replaces: `in`, len() and iteration cover
+    every configured river without building anything, while [], get(),
+    values() and items() build robots on demand. loaded() and
+    get_loaded() only look at robots that already exist, so read-only
+    callers can skip idle rivers entirely.
+
+    `factory(**config)` builds one robot from its config entry. Changes
+    made through add()/remove()/update() are written back to `path`.
+    """
+
+    def __init__(self, factory, path=FLEET_FILE, config=None):
+        self.factory = factory
+        self.path = path
+        self._lock = threading.RLock()
+        self._robots = {}
+        self._building = {}
+        self._configs = config if config is not None else self.load_config()
+
+    # ---------- config ----------
+
+    def load_config(self):
+        """Fleet file contents, or the default five rivers when there is no file"""
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    fleet = json.load(f)
+                return {river_id: self._normalize(river_id, config) for river_id, config in fleet.items()}
+            except (OSError, ValueError, TypeError) as e:
+                print(f"⚠️  Could not read {self.path} ({e}), using default fleet")
+        return {river_id: dict(config) for river_id, config in DEFAULT_FLEET.items()}
+
+    def save_config(self):
+        if not self.path:
+            return
+        with self._lock:
+            fleet = {river_id: dict(config) for river_id, config in self._configs.items()}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(fleet, f, indent=2)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _normalize(river_id, config):
+        config = dict(config or {})
+        config.setdefault("robot_id", f"robot-{river_id}")
+        config.setdefault("river_name", river_id)
+        data_file = config.get("data_file")
+        if data_file and (os.path.basename(data_file) != data_file or data_file in (".", "..")):
+            # Only bare file names in the data directory
+            print(f"⚠️  Ignoring data_file {data_file!r} for {river_id}")
+            data_file = None
+        config["data_file"] = data_file or f"robot_data_{river_id}.json"
+        return config
+
+    def config(self, river_id):
+        with self._lock:
+            return dict(self._configs[river_id])
+
+    def configs(self):
+        with self._lock:
+            return {river_id: dict(config) for river_id, config in self._configs.items()}
+
+    # ---------- membership ----------
+
+    def add(self, river_id, **config):
+        """Register a river (its robot is built on first access)"""
+        with self._lock:
+            if river_id in self._configs:
+                raise ValueError(f"River already in fleet: {river_id}")
+            self._configs[river_id] = self._normalize(river_id, config)
+        self.save_config()
+        print(f"✓ Added {river_id} to fleet")
+        return self.config(river_id)
+
+    def update(self, river_id, **changes):
+        """Change a river's config (e.g. river_name) for robots built later"""
+        with self._lock:
+            self._configs[river_id].update(changes)
+        self.save_config()
+
+    def remove(self, river_id):
+        """Drop a river from the fleet; its stored readings are kept"""
+        with self._lock:
+            if river_id not in self._configs:
+                raise KeyError(river_id)
+            del self._configs[river_id]
+        self.unload(river_id)
+        self.save_config()
+        print(f"✓ Removed {river_id} from fleet")
+
+    def unload(self, river_id):
+        """Stop and release a built robot (it is rebuilt on next access)"""
+        with self._lock:
+            robot = self._robots.pop(river_id, None)
+        if robot is None:
+            return False
+        robot.close()
+        return True
+
+    # ---------- robots ----------
+
+    def get(self, river_id, default=None):
+        robot = self._robots.get(river_id)
+        if robot is not None:
+            return robot
+        with self._lock:
+            robot = self._robots.get(river_id)
+            if robot is not None:
+                return robot
+            if river_id not in self._configs:
+                return default
+            # Build outside the registry lock: loading history can be slow
+            building = self._building.get(river_id)
+            if building is None:
+                building = self._building[river_id] = threading.Lock()
+        with building:
+            with self._lock:
+                robot = self._robots.get(river_id)
+                config = self._configs.get(river_id)
+            if robot is None and config is not None:
+                robot = self.factory(**config)
+                with self._lock:
+                    self._building.pop(river_id, None)
+                    removed = river_id not in self._configs
+                    if not removed:
+                        self._robots[river_id] = robot
+                if removed:
+                    robot.close()
+                    robot = None
+        return robot if robot is not None else default
+
+    def get_loaded(self, river_id):
+        return self._robots.get(river_id)
+
+    def loaded(self):
+        """Robots built so far: {river_id: robot}"""
+        with self._lock:
+            return dict(self._robots)
+
+    def close(self):
+        for river_id in list(self.loaded()):
+            self.unload(river_id)
+
+    # ---------- dict interface ----------
+
+    def __contains__(self, river_id):
+        return river_id in self._configs
+
+    def __getitem__(self, river_id):
+        robot = self.get(river_id)
+        if robot is None:
+            raise KeyError(river_id)
+        return robot
+
+    def __delitem__(self, river_id):
+        self.remove(river_id)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._configs)
+
+    def keys(self):
+        with self._lock:
+            return list(self._configs)
+
+    def values(self):
+        return [robot for _, robot in self.items()]
+
+    def items(self):
+        robots = ((river_id, self.get(river_id)) for river_id in self.keys())
+        return [(river_id, robot) for river_id, robot in robots if robot is not None]
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "configured": len(self._configs),
+                "loaded": len(self._robots),
+                "rivers": {river_id: dict(config, loaded=river_id in self._robots)
+                           for river_id, config in self._configs.items()}
+            }
@@ -0,0 +1,329 @@
+# forest_engine.py
+# Flat-array evaluator for the quality RandomForest (no sklearn at predict time)
+
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+# Bump when the .npz layout changes
+NPZ_FORMAT = 1
+ARRAYS = ("feature", "threshold", "children", "value", "roots", "mean", "scale")
+
+
+class CompiledForest:
+    """
+    A fitted RandomForestRegressor (+ StandardScaler) flattened into arrays
+
+    All trees share one set of node arrays (feature, threshold,
+    children, value); `roots` holds each tree's first node and node i's
+    children sit at children[2i] (left) and children[2i + 1] (right).
+    Leaves point to themselves, so every sample takes the same number of
+    steps and all trees are walked together.
+
+    The scaler is folded into the thresholds: sklearn tests
+    float32((x - mean) / scale) <= t, and for each node we store the
+    largest raw float64 x that passes. Raw inputs then give the same
+    branch decisions as the sklearn pipeline.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, depth, n_features,
+                 mean=None, scale=None, meta=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.n_trees = len(roots)
+        self.n_features = int(n_features)
+        # Scaler parameters (already folded into threshold; kept for reference)
+        self.mean = np.zeros(n_features) if mean is None else mean
+        self.scale = np.ones(n_features) if scale is None else scale
+        self.meta = meta or {}
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            idx = np.arange(n)
+            is_leaf = tree.children_left == -1
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+            values.append(tree.value.reshape(n, -1)[:, 0])
+            depth = max(depth, tree.max_depth)
+            offset += n
+
+        feature = np.concatenate(features).astype(np.intp)
+        threshold = np.concatenate(thresholds).astype(np.float64)
+        n_features = model.n_features_in_
+        mean, scale = np.zeros(n_features), np.ones(n_features)
+        if scaler is not None:
+            if scaler.mean_ is not None:
+                mean = scaler.mean_.astype(np.float64)
+            if scaler.scale_ is not None:
+                scale = scaler.scale_.astype(np.float64)
+            threshold = fold_scaler(threshold, mean[feature], scale[feature])
+
+        children = np.empty(2 * offset, dtype=np.intp)
+        children[0::2] = np.concatenate(lefts)
+        children[1::2] = np.concatenate(rights)
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=children,
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.array(roots, dtype=np.intp),
+            depth=depth,
+            n_features=n_features,
+            mean=mean,
+            scale=scale
+        )
+
+    def leaves(self, X):
+        """(n_trees, N) leaf index reached by each sample in each tree"""
+        n = len(X)
+        # Feature-major copy so one tree level is a single flat gather
+        flat = np.ascontiguousarray(X.T).ravel()
+        cols = np.arange(n)
+        nodes = np.repeat(self.roots[:, None], n, axis=1)
+        for _ in range(self.depth):
+            x = flat.take(self.feature.take(nodes) * n + cols)
+            nodes = self.children.take(2 * nodes + (x > self.threshold.take(nodes)))
+        return nodes
+
+    def predict(self, X):
+        """Scores for an (N, n_features) array of raw (unscaled) inputs"""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features)
+        leaf_values = self.value.take(self.leaves(X))
+        # Same summation order as sklearn (tree by tree), so results match bit for bit
+        out = np.zeros(len(X))
+        for row in leaf_values:
+            out += row
+        out /= self.n_trees
+        return out
+
+    def predict_one(self, x):
+        """Score for one raw input row (fast path, no batch bookkeeping)"""
+        x = np.asarray(x, dtype=np.float64)
+        nodes = self.roots
+        for _ in range(self.depth):
+            go_right = x.take(self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+        total = 0.0
+        for v in self.value.take(nodes).tolist():
+            total += v
+        return np.float64(total) / self.n_trees
+
+
+    # ---------- .npz export / memory-mapped import ----------
+
+    def save(self, path, meta=None):
+        """
+        Write the arrays to an uncompressed .npz (atomic replace)
+        `meta` is stored as JSON, so loading never unpickles anything.
+        """
+        meta = dict(self.meta, **(meta or {}))
+        header = {"format": NPZ_FORMAT, "depth": self.depth, "n_features": self.n_features, **meta}
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in ARRAYS}
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(header)), **arrays)
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a forest written by save()
+
+        With mmap=True the node arrays are read-only views of the file's
+        pages, so every process loading the same file shares one copy in
+        the page cache and startup is just a few mmap calls.
+        """
+        arrays = _mmap_npz(path) if mmap else dict(np.load(path, allow_pickle=False))
+        header = json.loads(str(arrays.pop("meta")[()]))
+        if header.get("format") != NPZ_FORMAT:
+            raise ValueError(f"{path} is forest format {header.get('format')}, expected {NPZ_FORMAT}")
+        missing = [name for name in ARRAYS if name not in arrays]
+        if missing:
+            raise ValueError(f"{path} is missing arrays: {', '.join(missing)}")
+        depth = header.pop("depth")
+        n_features = header.pop("n_features")
+        header.pop("format")
+        return cls(depth=depth, n_features=n_features, meta=header,
+                   **{name: arrays[name] for name in ARRAYS})
+
+
+def _mmap_npz(path):
+    """
+    Members of an uncompressed .npz as read-only np.memmap arrays
+    (np.load ignores mmap_mode for .npz, so map each stored member at its
+    offset inside the zip)
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed, cannot memory-map")
+            # Local file header: 30 bytes, then file name and extra field
+            f.seek(info.header_offset)
+            local = f.read(30)
+            name_len, extra_len = struct.unpack("<HH", local[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {info.filename} holds Python objects")
+            size = int(np.prod(shape))
+            if not shape or not size:
+                # Scalars (the JSON header) and empty arrays: just read them
+                arrays[name] = np.frombuffer(f.read(size * dtype.itemsize), dtype=dtype).reshape(shape)
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(),
+                                     shape=shape, order="F" if fortran else "C")
+    return arrays
+
+
+def fold_scaler(threshold, mean, scale):
+    """
+    Raw-space thresholds equivalent to sklearn's scaled float32 test
+
+    For each node find the largest float64 x with
+    float32((x - mean) / scale) <= threshold, by bisection over the
+    ordered float64 bit patterns around the algebraic guess
+    threshold * scale + mean.
+    """
+    finite = np.isfinite(threshold)
+    result = threshold.copy()
+    t, m, s = threshold[finite], mean[finite], scale[finite]
+
+    def passes(x):
+        scaled = ((x - m) / s).astype(np.float32).astype(np.float64)
+        return scaled <= t
+
+    guess = t * s + m
+    width = np.abs(guess) * 1e-6 + 1e-6
+    lo = guess - width
+    hi = guess + width
+    # Widen until lo passes and hi fails
+    for _ in range(60):
+        bad = ~passes(lo) | passes(hi)
+        if not bad.any():
+            break
+        lo = np.where(passes(lo), lo, lo - width)
+        hi = np.where(passes(hi), hi + width, hi)
+        width *= 2
+
+    lo_k, hi_k = _ordered(lo), _ordered(hi)
+    # Invariant: lo passes, hi fails; stop when adjacent
+    for _ in range(70):
+        active = hi_k - lo_k > 1
+        if not active.any():
+            break
+        mid_k = lo_k + (hi_k - lo_k) // 2
+        ok = passes(_unordered(mid_k))
+        lo_k = np.where(active & ok, mid_k, lo_k)
+        hi_k = np.where(active & ~ok, mid_k, hi_k)
+
+    result[finite] = _unordered(lo_k)
+    return result
+
+
+_INT64_MIN = np.int64(-0x8000000000000000)
+
+
+def _ordered(x):
+    """float64 -> int64 keys with the same ordering as the floats"""
+    i = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(i < 0, _INT64_MIN - i, i)
+
+
+def _unordered(k):
+    i = np.where(k < 0, _INT64_MIN - k, k)
+    return i.astype(np.int64).view(np.float64)
+
+
+def equivalence_samples(forest, n=20000, seed=0):
+    """
+    Inputs for checking a compiled forest against sklearn: random rows at
+    sensor precision, plus rows sitting exactly on (and one ulp either side
+    of) every split threshold
+    Returns: (X, number of boundary rows)
+    """
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(5.0, 9.5, n),
+        rng.uniform(0.0, 9.0, n),
+        rng.uniform(15.0, 36.0, n),
+        rng.uniform(50.0, 900.0, n),
+    ]).round(2)
+    internal = np.isfinite(forest.threshold)
+    edges = []
+    for f, b in zip(forest.feature[internal], forest.threshold[internal]):
+        for x in (b, np.nextafter(b, np.inf), np.nextafter(b, -np.inf)):
+            row = X[len(edges) % n].copy()
+            row[f] = x
+            edges.append(row)
+    return np.vstack([X, np.array(edges)]), len(edges)
+
+
+# Equivalence check and latency comparison against sklearn
+# (the equivalence itself is asserted in tests/test_forest_engine.py)
+if __name__ == "__main__":
+    import time
+    from quality_predictor import QualityPredictor
+
+    predictor = QualityPredictor()
+    forest = CompiledForest.from_sklearn(predictor.model, predictor.scaler)
+
+    def sklearn_predict(X):
+        return predictor.model.predict(predictor.scaler.transform(X))
+
+    X, n_edges = equivalence_samples(forest)
+
+    expected = sklearn_predict(X)
+    got = forest.predict(X)
+    got_one = np.array([forest.predict_one(row) for row in X[:2000]])
+    print(f"Samples checked: {len(X)} ({n_edges} on split boundaries)")
+    print(f"Batch  max |diff|: {np.abs(got - expected).max():.3g}, exact: {np.array_equal(got, expected)}")
+    print(f"Single max |diff|: {np.abs(got_one - expected[:2000]).max():.3g}, "
+          f"exact: {np.array_equal(got_one, expected[:2000])}")
+
+    # Latency: single sample
+    row = X[0]
+    reps = 300
+    start = time.perf_counter()
+    for _ in range(reps):
+        sklearn_predict(row.reshape(1, -1))
+    t_sklearn = (time.perf_counter() - start) / reps
+    start = time.perf_counter()
+    for _ in range(reps * 10):
+        forest.predict_one(row)
+    t_compiled = (time.perf_counter() - start) / (reps * 10)
+    print(f"\nSingle sample: sklearn {t_sklearn * 1e6:.0f} us, compiled {t_compiled * 1e6:.1f} us "
+          f"({t_sklearn / t_compiled:.0f}x)")
+
+    # Latency: batch
+    batch = X[:1000]
+    start = time.perf_counter()
+    sklearn_predict(batch)
+    t_sklearn = time.perf_counter() - start
+    start = time.perf_counter()
+    forest.predict(batch)
+    t_compiled = time.perf_counter() - start
+    print(f"Batch of {len(batch)}: sklearn {t_sklearn * 1e3:.1f} ms, compiled {t_compiled * 1e3:.1f} ms")
@@ -0,0 +1,313 @@
+# inference_service.py
+# Micro-batched model scoring in worker processes, shared by all robots
+
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+
+import numpy as np
+
+from quality_predictor import FEATURES, QualityPredictor, get_shared_predictor
+
+# "local" scores in the mission thread (default), "pool" uses InferenceService
+INFERENCE_MODE = os.environ.get("AQUATIC_INFERENCE", "local")
+INFERENCE_WORKERS = int(os.environ.get("AQUATIC_INFERENCE_WORKERS", "1"))
+
+# Workers are spawned, not forked: forking while mission/writer/Flask threads
+# hold locks (stdout, logging) can leave a child hung on one of them
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+
+# ==================== WORKER PROCESS ====================
+
+_worker_predictor = None
+
+
+def _init_worker(npz_path):
+    global _worker_predictor
+    _worker_predictor = QualityPredictor(auto_train=False)
+    _worker_predictor.load_npz(npz_path)
+
+
+def _score_batch(X):
+    return _worker_predictor.predict_batch(X)
+
+
+# ==================== SERVICE ====================
+
+class InferenceService:
+    """
+    Coalesces scoring requests from many threads into micro-batches
+
+    A caller blocks only on its own result. The dispatcher thread waits up
+    to `window` seconds after the first request (or until `max_batch`
+    requests) and sends the batch to a process pool. Several batches can
+    be in flight at once. Results come back as plain scores, and status
+    and warnings are added on the caller's thread.
+
+    The workers score with the model that is live in `predictor`,
+    exported once per model generation to a .npz that every worker
+    memory-maps (one shared copy). When that model is swapped
+    (retraining), the pool restarts with the new one. Without worker
+    processes (`processes=0`, the pool fails, or a result times out)
+    batches are scored in-process instead.
+    """
+
+    def __init__(self, predictor=None, processes=1, window=0.005, max_batch=256,
+                 timeout=2.0, latency_samples=1000):
+        self._predictor = predictor
+        self.processes = processes
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+        self._queue = queue.Queue()
+        self._pool = None
+        self._pool_generation = None
+        self._pool_file = None
+        self._pool_failed = False
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_samples)
+        self._started = time.monotonic()
+
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.pool_restarts = 0
+
+        self._thread = threading.Thread(target=self._run, name="inference-dispatch", daemon=True)
+        self._closed = False
+        self._thread.start()
+
+    @property
+    def predictor(self):
+        return self._predictor or get_shared_predictor()
+
+    # ---------- predictor interface ----------
+
+    def predict_quality(self, sensor_data):
+        features = [float(sensor_data[f]) for f in FEATURES]
+        future = Future()
+        started = time.perf_counter()
+        self._queue.put((features, future))
+        try:
+            score = future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._stats_lock:
+                self.fallbacks += 1
+                self.timeouts += 1
+            self._abandon_pool()
+            score = self.predictor.predict_quality(sensor_data)
+        with self._stats_lock:
+            self.requests += 1
+            self._latencies.append(time.perf_counter() - started)
+        return score
+
+    def get_quality_details(self, sensor_data, rules=None):
+        score = self.predict_quality(sensor_data)
+        return self.predictor.get_quality_details(sensor_data, quality_score=score, rules=rules)
+
+    def predict_batch(self, sensor_data):
+        return self.predictor.predict_batch(sensor_data)
+
+    def get_quality_status(self, quality_score):
+        return self.predictor.get_quality_status(quality_score)
+
+    # ---------- dispatch ----------
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        X = np.array([features for features, _ in batch], dtype=np.float64)
+        with self._stats_lock:
+            self.batches += 1
+            self.batched_requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        pool = self._get_pool()
+        if pool is None:
+            self._score_locally(batch, X)
+            return
+        try:
+            pending = pool.submit(_score_batch, X)
+        except Exception:
+            self._drop_pool(pool)
+            self._score_locally(batch, X)
+            return
+        pending.add_done_callback(lambda done: self._complete(batch, X, pool, done))
+
+    def _complete(self, batch, X, pool, done):
+        try:
+            scores = done.result()
+        except Exception as e:
+            print(f"⚠️  Inference worker failed ({e}), scoring in-process")
+            self._drop_pool(pool)
+            self._score_locally(batch, X)
+            return
+        for (_, future), score in zip(batch, scores.tolist()):
+            future.set_result(score)
+
+    def _score_locally(self, batch, X):
+        if self.processes:
+            with self._stats_lock:
+                self.fallbacks += len(batch)
+        try:
+            scores = self.predictor.predict_batch(X).tolist()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), score in zip(batch, scores):
+            future.set_result(score)
+
+    # ---------- worker pool ----------
+
+    def _get_pool(self):
+        """Pool running the live model generation (restarted after a swap)"""
+        if not self.processes or self._pool_failed:
+            return None
+        bundle = self.predictor.active
+        with self._pool_lock:
+            if self._pool is not None and self._pool_generation == bundle.generation:
+                return self._pool
+            old, self._pool = self._pool, None
+            if old is not None:
+                old.shutdown(wait=False)
+                self.pool_restarts += 1
+            self._remove_pool_file()
+            try:
+                self._pool_file = os.path.join(
+                    tempfile.gettempdir(), f"aquatic_model_{os.getpid()}_g{bundle.generation}.npz")
+                self.predictor.export_npz(self._pool_file, bundle)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=POOL_CONTEXT,
+                    initializer=_init_worker,
+                    initargs=(self._pool_file,)
+                )
+                self._pool_generation = bundle.generation
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not start inference workers ({e}), scoring in-process")
+                self._pool_failed = True
+            return self._pool
+
+    def _remove_pool_file(self):
+        # Running workers keep their mapping; the file only has to outlive pool start-up
+        if self._pool_file is not None:
+            try:
+                os.remove(self._pool_file)
+            except OSError:
+                pass
+            self._pool_file = None
+
+    def _drop_pool(self, pool):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+                self._pool_generation = None
+        pool.shutdown(wait=False)
+
+    def _abandon_pool(self):
+        """
+        A result timed out: a hung worker never completes its batch, so
+        keeping the pool would make every later request wait out the
+        timeout too. Score in-process from now on.
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            self._pool_generation = None
+            if self._pool_failed:
+                return
+            self._pool_failed = True
+        print(f"⚠️  Inference result timed out after {self.timeout}s, scoring in-process")
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+            self._remove_pool_file()
+
+    # ---------- metrics ----------
+
+    def get_stats(self):
+        with self._stats_lock:
+            latencies = np.array(self._latencies)
+            elapsed = time.monotonic() - self._started
+            stats = {
+                "processes": self.processes,
+                "window_ms": self.window * 1000,
+                "requests": self.requests,
+                "batches": self.batches,
+                "avg_batch": round(self.batched_requests / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "fallbacks": self.fallbacks,
+                "timeouts": self.timeouts,
+                "pool_failed": self._pool_failed,
+                "pool_restarts": self.pool_restarts,
+                "queue_depth": self._queue.qsize(),
+                "throughput_per_s": round(self.requests / elapsed, 2) if elapsed else 0.0
+            }
+        if len(latencies):
+            p50, p99 = np.percentile(latencies, [50, 99]).tolist()
+            stats["latency_ms"] = {"p50": round(p50 * 1000, 3), "p99": round(p99 * 1000, 3),
+                                   "max": round(float(latencies.max()) * 1000, 3)}
+        return stats
+
+
+# ==================== PROCESS-WIDE PREDICTOR ====================
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_inference_service():
+    """Shared InferenceService, or None unless AQUATIC_INFERENCE=pool"""
+    global _service
+    if INFERENCE_MODE != "pool":
+        return None
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = InferenceService(processes=INFERENCE_WORKERS)
+    return _service
+
+
+def get_predictor():
+    """What robots score with by default: the service when enabled, else the shared predictor"""
+    return get_inference_service() or get_shared_predictor()
@@ -0,0 +1,285 @@
+# mission_scheduler.py
+# One timer thread driving the periodic sampling ticks of every active robot
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from sim_clock import get_clock
+
+SCHEDULER_WORKERS = int(os.environ.get("AQUATIC_SCHEDULER_WORKERS", "8"))
+
+
+class ScheduledJob:
+    """
+    A periodic tick registered with a MissionScheduler
+
+    Tick k is due at start + k * interval (no drift from tick run time).
+    `end_reason` is set the moment the job stops ("completed",
+    "cancelled" or "error"); wait() returns once the last tick and
+    on_finish have run.
+    """
+
+    def __init__(self, scheduler, name, tick, interval, start, end, on_finish):
+        self.scheduler = scheduler
+        self.name = name
+        self.tick = tick
+        self.interval = interval
+        self.start = start
+        self.end = end
+        self.on_finish = on_finish
+        self.next_due = start
+        # Slots are base + k * interval (no accumulated float error)
+        self._base = start
+        self._slot = 0
+
+        self.ticks = 0
+        self.missed = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.error = None
+        self.end_reason = None
+
+        self._running = False
+        self._finished = False
+        self._done = threading.Event()
+
+    @property
+    def active(self):
+        return self.end_reason is None
+
+    def cancel(self):
+        return self.scheduler.cancel(self)
+
+    def set_interval(self, interval):
+        """New period, counted from the next already-scheduled tick"""
+        with self.scheduler._cond:
+            self._base = self.next_due
+            self._slot = 0
+            self.interval = interval
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "active": self.active,
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "last_lateness_ms": round(self.last_lateness * 1000, 3),
+            "max_lateness_ms": round(self.max_lateness * 1000, 3),
+            "avg_tick_ms": round(self.total_duration / self.ticks * 1000, 3) if self.ticks else 0.0,
+            "max_tick_ms": round(self.max_duration * 1000, 3),
+            "end_reason": self.end_reason,
+            "error": self.error
+        }
+
+
+class MissionScheduler:
+    """
+    Drives any number of periodic jobs from one timer thread
+
+    Jobs wait in a heap keyed on their next due time. The timer thread
+    sleeps until the earliest one and hands the tick to a small worker
+    pool, so a slow tick never delays other robots. A job whose previous
+    tick is still running, or which fell more than one interval behind,
+    skips those slots and counts them as missed instead of bursting to
+    catch up.
+
+    Due times are on `clock` (see sim_clock); on a simulated clock with
+    no speed the timer jumps to the next due tick as soon as no tick is
+    running, instead of sleeping.
+    """
+
+    def __init__(self, workers=SCHEDULER_WORKERS, latency_samples=2000, clock=None):
+        self.clock = clock or get_clock()
+        self._in_flight = 0
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mission-tick")
+        self._thread = None
+        self._jobs = set()
+
+        self._lateness = deque(maxlen=latency_samples)
+        self._durations = deque(maxlen=latency_samples)
+        self.ticks = 0
+        self.missed = 0
+        self.jobs_started = 0
+
+    # ---------- jobs ----------
+
+    def schedule(self, tick, interval=1.0, duration=None, on_finish=None, name=None):
+        """
+        Call tick() every `interval` seconds, starting now, for `duration`
+        seconds (None = until cancelled); on_finish(job) runs once at the end
+        """
+        start = self.clock.monotonic()
+        end = start + duration if duration is not None else None
+        job = ScheduledJob(self, name or getattr(tick, "__name__", "job"), tick, interval, start, end, on_finish)
+        with self._cond:
+            self._jobs.add(job)
+            self.jobs_started += 1
+            heapq.heappush(self._heap, (job.next_due, next(self._order), job))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mission-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return job
+
+    def cancel(self, job):
+        """Stop a job; no tick starts after this returns. False if it had already ended."""
+        with self._cond:
+            if job.end_reason is not None:
+                return False
+            job.end_reason = "cancelled"
+            running = job._running
+            self._cond.notify()
+        if not running:
+            self._executor.submit(self._finish, job)
+        return True
+
+    # ---------- timer thread ----------
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].end_reason is not None:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due, _, job = self._heap[0]
+                now = self.clock.monotonic()
+                if due > now:
+                    speed = self.clock.speed
+                    if speed is None:
+                        # As fast as possible: skip ahead once every tick has finished
+                        if self._in_flight:
+                            self._cond.wait()
+                        else:
+                            self.clock.advance(due - now)
+                    else:
+                        self._cond.wait((due - now) / speed)
+                    continue
+                heapq.heappop(self._heap)
+
+                if job.end is not None and due > job.end + 1e-9:
+                    job.end_reason = "completed"
+                    if not job._running:
+                        self._executor.submit(self._finish, job)
+                    continue
+
+                if job._running:
+                    # Previous tick overran its slot: skip this one
+                    job.missed += 1
+                    self.missed += 1
+                else:
+                    job._running = True
+                    self._in_flight += 1
+                    self._executor.submit(self._run_tick, job, due)
+
+                job._slot += 1
+                next_due = job._base + job._slot * job.interval
+                if next_due < now - job.interval:
+                    # Far behind (stalled process): drop the missed slots
+                    behind = int((now - next_due) // job.interval)
+                    job._slot += behind
+                    next_due = job._base + job._slot * job.interval
+                    job.missed += behind
+                    self.missed += behind
+                job.next_due = next_due
+                heapq.heappush(self._heap, (next_due, next(self._order), job))
+
+    def _run_tick(self, job, due):
+        lateness = self.clock.monotonic() - due
+        started = time.perf_counter()
+        error = None
+        try:
+            job.tick()
+        except Exception as e:
+            error = e
+        duration = time.perf_counter() - started
+
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+            job._running = False
+            job.ticks += 1
+            job.last_lateness = lateness
+            job.max_lateness = max(job.max_lateness, lateness)
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+            self.ticks += 1
+            self._lateness.append(lateness)
+            self._durations.append(duration)
+            if error is not None and job.end_reason is None:
+                job.error = str(error)
+                job.end_reason = "error"
+            ended = job.end_reason is not None
+        if error is not None:
+            print(f"❌ Error in {job.name}: {error}")
+        if ended:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._cond:
+            if job._finished:
+                return
+            job._finished = True
+            self._jobs.discard(job)
+        try:
+            if job.on_finish:
+                job.on_finish(job)
+        except Exception as e:
+            print(f"❌ Error finishing {job.name}: {e}")
+        finally:
+            job._done.set()
+
+    # ---------- metrics ----------
+
+    def get_stats(self):
+        with self._cond:
+            lateness = np.array(self._lateness)
+            durations = np.array(self._durations)
+            stats = {
+                "active_jobs": len(self._jobs),
+                "jobs_started": self.jobs_started,
+                "ticks": self.ticks,
+                "missed_ticks": self.missed,
+                "clock_speed": self.clock.speed,
+                "jobs": [job.to_dict() for job in self._jobs]
+            }
+        for name, values in (("lateness_ms", lateness), ("tick_ms", durations)):
+            if len(values):
+                p50, p99 = (np.percentile(values, [50, 99]) * 1000).tolist()
+                stats[name] = {"p50": round(p50, 3), "p99": round(p99, 3),
+                               "max": round(float(values.max()) * 1000, 3)}
+        return stats
+
+
+_schedulers = {}
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(clock=None):
+    """Process-wide scheduler shared by all robots on the same clock"""
+    clock = clock or get_clock()
+    scheduler = _schedulers.get(clock)
+    if scheduler is None:
+        with _scheduler_lock:
+            scheduler = _schedulers.get(clock)
+            if scheduler is None:
+                scheduler = _schedulers[clock] = MissionScheduler(clock=clock)
+    return scheduler
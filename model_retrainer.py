@@ -0,0 +1,210 @@
+# model_retrainer.py
+# Background refit of the quality model on accumulated readings
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+from quality_predictor import FEATURES, SEED_X, SEED_Y, ModelBundle, fit_model, get_shared_predictor
+
+
+def collect_training_data(stores, max_readings=20000):
+    """
+    (X, y) from ReadingStores: sensor columns and the score recorded with
+    each reading, newest `max_readings` in total
+    """
+    Xs, ys = [], []
+    for store in stores:
+        if not len(store):
+            continue
+        cols = store.columns(FEATURES + ("score",))
+        Xs.append(np.column_stack([cols[f] for f in FEATURES]))
+        ys.append(cols["score"])
+    if not Xs:
+        return np.empty((0, len(FEATURES))), np.empty(0)
+    X = np.concatenate(Xs)[-max_readings:]
+    y = np.concatenate(ys)[-max_readings:]
+    return X, y
+
+
+def mean_abs_error(bundle, X, y):
+    predicted = np.clip(bundle.predict(X), 0, 100)
+    return float(np.mean(np.abs(predicted - y)))
+
+
+class ModelRetrainer:
+    """
+    Periodically refits the predictor on readings from `stores` (a
+    callable returning ReadingStores) and hot-swaps the result in
+
+    `interval` of 0/None (the default) means only on demand (retrain_now()).
+    Fitting runs in a worker process, so mission threads keep scoring on
+    the current model the whole time. A candidate goes live only if, on
+    held-out readings, it is no worse than the current model and it still
+    agrees with the seed samples to within `max_seed_error`. The seed
+    samples are always part of the training set.
+
+    Limitation: the labels are the `score` column, i.e. the live model's
+    own earlier output, not measured ground truth. The current model
+    scores ~0 error on them, so in practice candidates are rejected;
+    periodic retraining only becomes useful once readings carry real
+    lab-verified scores.
+    """
+
+    def __init__(self, stores, predictor=None, interval=0, min_readings=200,
+                 max_readings=20000, holdout=0.2, max_seed_error=10.0,
+                 timeout=300, executor=None):
+        self.stores = stores
+        self._predictor = predictor
+        self.interval = interval
+        self.min_readings = min_readings
+        self.max_readings = max_readings
+        self.holdout = holdout
+        self.max_seed_error = max_seed_error
+        self.timeout = timeout
+
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._rng = np.random.default_rng()
+
+        self.runs = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.failures = 0
+        self.running = False
+        self.last_result = None
+
+    @property
+    def predictor(self):
+        return self._predictor or get_shared_predictor()
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-retrainer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def retrain_now(self):
+        """Ask the background thread to run as soon as it is free"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval or None)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failures += 1
+                self.last_result = {"status": "failed", "error": str(e), "at": datetime.now().isoformat()}
+                print(f"⚠️  Model retraining failed: {e}")
+
+    # ---------- one retraining pass ----------
+
+    def run_once(self):
+        """Collect, fit, validate and (maybe) swap; returns the result dict"""
+        with self._run_lock:
+            self.running = True
+            try:
+                result = self._retrain()
+            finally:
+                self.running = False
+            result["at"] = datetime.now().isoformat()
+            self.last_result = result
+            return result
+
+    def _retrain(self):
+        self.runs += 1
+        X, y = collect_training_data(self.stores(), self.max_readings)
+        if len(X) < self.min_readings:
+            self.skipped += 1
+            return {"status": "skipped", "readings": len(X), "min_readings": self.min_readings}
+
+        order = self._rng.permutation(len(X))
+        n_holdout = max(1, int(len(X) * self.holdout))
+        test, train = order[:n_holdout], order[n_holdout:]
+        X_train = np.vstack([SEED_X, X[train]])
+        y_train = np.concatenate([SEED_Y, y[train]])
+
+        started = time.perf_counter()
+        model, scaler = self._fit(X_train, y_train)
+        fit_seconds = round(time.perf_counter() - started, 3)
+
+        candidate = ModelBundle(model, scaler)
+        current_mae = mean_abs_error(self.predictor.active, X[test], y[test])
+        holdout_mae = mean_abs_error(candidate, X[test], y[test])
+        seed_mae = mean_abs_error(candidate, SEED_X, SEED_Y)
+        result = {
+            "readings": len(X),
+            "fit_seconds": fit_seconds,
+            "holdout_mae": round(holdout_mae, 3),
+            "current_holdout_mae": round(current_mae, 3),
+            "seed_mae": round(seed_mae, 3)
+        }
+
+        if holdout_mae > current_mae or seed_mae > self.max_seed_error:
+            self.rejected += 1
+            result["status"] = "rejected"
+            print(f"🧠 Retrained model rejected (holdout MAE {holdout_mae:.2f} vs {current_mae:.2f}, "
+                  f"seed MAE {seed_mae:.2f})")
+            return result
+
+        bundle = self.predictor.install(model, scaler, compiled=candidate.compiled,
+                                        source="retrain", samples=len(X_train),
+                                        holdout_mae=result["holdout_mae"], seed_mae=result["seed_mae"])
+        self.accepted += 1
+        result["status"] = "accepted"
+        result["generation"] = bundle.generation
+        print(f"🧠 Model retrained on {len(X_train)} samples (generation {bundle.generation}, "
+              f"holdout MAE {holdout_mae:.2f})")
+        return result
+
+    def _fit(self, X, y):
+        if self._executor is None:
+            # Spawn: a fork could copy a lock another thread holds into the child
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return self._executor.submit(fit_model, X, y).result(timeout=self.timeout)
+        except (BrokenProcessPool, OSError) as e:
+            # Worker died or could not start: fit on this (background) thread instead
+            print(f"⚠️  Retraining worker unavailable ({e}), fitting in-process")
+            if self._owns_executor:
+                self._executor = None
+            return fit_model(X, y)
+
+    def get_stats(self):
+        active = self.predictor.active
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_result": self.last_result,
+            "model": {"generation": active.generation, **active.info} if active else None
+        }
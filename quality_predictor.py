@@ -2,10 +2,155 @@
 # AI Model for predicting water quality based on sensor readings
 
 import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 import pickle
 import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+from forest_engine import CompiledForest
+from quality_rules import CHANNELS, get_rules
+
+# Feature order used by the model
+FEATURES = CHANNELS
+
+# Bump when the training data or model settings change, so old artifacts are rebuilt
+MODEL_VERSION = 1
+MODEL_ARTIFACT = f"quality_model_v{MODEL_VERSION}.pkl"
+MODEL_NPZ = f"quality_model_v{MODEL_VERSION}.npz"
+
+# Status bands: score >= 90 Excellent, >= 70 Good, >= 50 Fair, >= 30 Poor
+STATUS_THRESHOLDS = np.array([30, 50, 70, 90])
+STATUS_LABELS = np.array(["Very Poor", "Poor", "Fair", "Good", "Excellent"])
+
+# Entries in the shared predictor's score cache (0, the default, disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get("AQUATIC_PREDICTION_CACHE", "0"))
+
+# Above this many rows sklearn's own tree walk beats the compiled forest
+COMPILED_BATCH_LIMIT = 2048
+
+
+def to_feature_matrix(sensor_data):
+    """
+    (N, 4) float array from an array-like or a list of sensor dicts
+    """
+    if isinstance(sensor_data, np.ndarray):
+        X = sensor_data.astype(np.float64, copy=False)
+    elif len(sensor_data) and isinstance(sensor_data[0], dict):
+        X = np.array([[d[f] for f in FEATURES] for d in sensor_data], dtype=np.float64)
+    else:
+        X = np.asarray(sensor_data, dtype=np.float64)
+    return X.reshape(-1, len(FEATURES))
+
+
+class PredictionCache:
+    """
+    Bounded LRU of quality scores keyed on the exact sensor values
+    (SensorReader already reports 2 decimals, so repeats still hit)
+    """
+    
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key(self, sensor_data):
+        return tuple(float(sensor_data[f]) for f in FEATURES)
+    
+    def get(self, key):
+        with self._lock:
+            score = self._entries.get(key)
+            if score is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return score
+    
+    def put(self, key, score):
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Seed training data: [pH, Turbidity, Temperature, TDS]
+SEED_X = np.array([
+    [7.0, 2.0, 25, 300],    # Good water
+    [7.5, 1.5, 26, 250],    # Excellent water
+    [6.8, 3.0, 24, 400],    # Fair water
+    [8.0, 4.0, 28, 500],    # Poor water
+    [7.2, 2.5, 25, 350],    # Good water
+    [6.5, 5.0, 30, 600],    # Bad water
+    [8.2, 1.0, 22, 200],    # Excellent water
+    [5.5, 8.0, 35, 800],    # Very bad water
+    [7.8, 2.0, 27, 300],    # Good water
+    [7.1, 3.5, 26, 450],    # Fair water
+])
+
+# Quality scores (0-100, higher is better)
+SEED_Y = np.array([85, 95, 70, 50, 80, 40, 98, 20, 82, 65])
+
+
+def fit_model(X, y, n_estimators=50, random_state=42):
+    """
+    Fit a fresh scaler + forest
+    Module-level and side-effect free so it can run in a worker process.
+    """
+    scaler = StandardScaler()
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+
+class ModelBundle:
+    """
+    A fitted model + scaler and its compiled form
+    Predictions read one bundle reference, so swapping in a new bundle is
+    atomic: a score never mixes parts of two models.
+    Bundles loaded from .npz are compiled-only (model and scaler are None).
+    """
+    
+    def __init__(self, model, scaler, generation=0, info=None, compiled=None):
+        self.model = model
+        self.scaler = scaler
+        self.compiled = compiled or CompiledForest.from_sklearn(model, scaler)
+        self.generation = generation
+        self.info = info or {}
+    
+    def predict(self, X):
+        """Raw (unclamped) scores for an (N, 4) array"""
+        if self.model is None or len(X) <= COMPILED_BATCH_LIMIT:
+            return self.compiled.predict(X)
+        return self.model.predict(self.scaler.transform(X))
+
 
 class QualityPredictor:
     """
@@ -13,65 +158,96 @@ class QualityPredictor:
     Based on pH, turbidity, temperature, and TDS
     """
     
-    def __init__(self):
-        self.model = RandomForestRegressor(n_estimators=50, random_state=42)
-        self.scaler = StandardScaler()
+    def __init__(self, auto_train=True, cache_size=0):
+        self.active = None
         self.is_trained = False
-        self.train_model()
+        self.sklearn_version = sklearn.__version__
+        self.cache = PredictionCache(cache_size) if cache_size else None
+        self._install_lock = threading.Lock()
+        if auto_train:
+            self.train_model()
+    
+    @property
+    def model(self):
+        return self.active.model if self.active else None
+    
+    @property
+    def scaler(self):
+        return self.active.scaler if self.active else None
+    
+    @property
+    def compiled(self):
+        return self.active.compiled if self.active else None
     
     def train_model(self):
         """
         Train the model with sample water quality data
         """
-        # Training data: [pH, Turbidity, Temperature, TDS]
-        X_train = np.array([
-            [7.0, 2.0, 25, 300],    # Good water
-            [7.5, 1.5, 26, 250],    # Excellent water
-            [6.8, 3.0, 24, 400],    # Fair water
-            [8.0, 4.0, 28, 500],    # Poor water
-            [7.2, 2.5, 25, 350],    # Good water
-            [6.5, 5.0, 30, 600],    # Bad water
-            [8.2, 1.0, 22, 200],    # Excellent water
-            [5.5, 8.0, 35, 800],    # Very bad water
-            [7.8, 2.0, 27, 300],    # Good water
-            [7.1, 3.5, 26, 450],    # Fair water
-        ])
-        
-        # Quality scores (0-100, higher is better)
-        y_train = np.array([85, 95, 70, 50, 80, 40, 98, 20, 82, 65])
-        
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        
-        # Train model
-        self.model.fit(X_train_scaled, y_train)
-        self.is_trained = True
+        model, scaler = fit_model(SEED_X, SEED_Y)
+        self.install(model, scaler, source="seed", samples=len(SEED_X))
         print("AI Model trained successfully!")
     
+    def install(self, model, scaler, compiled=None, **info):
+        """
+        Make a fitted model + scaler live (compiles it first, then swaps the
+        bundle reference in one assignment; in-flight scores finish on the
+        old bundle)
+        """
+        with self._install_lock:
+            generation = self.active.generation + 1 if self.active else 1
+            bundle = ModelBundle(model, scaler, generation, info, compiled)
+            self.active = bundle
+            self.is_trained = True
+            if self.cache is not None:
+                self.cache.clear()
+        return bundle
+    
     def predict_quality(self, sensor_data):
         """
         Predict water quality score
         Input: {pH, turbidity, temperature, TDS}
         Output: Quality score (0-100)
         """
-        features = np.array([[
-            sensor_data["pH"],
-            sensor_data["turbidity"],
-            sensor_data["temperature"],
-            sensor_data["TDS"]
-        ]])
+        bundle = self.active
+        if self.cache is None:
+            return self._score(bundle, [sensor_data[f] for f in FEATURES])
         
-        # Scale features using the same scaler
-        features_scaled = self.scaler.transform(features)
-        
-        # Predict
-        quality_score = self.model.predict(features_scaled)[0]
+        # Exact values as the key: a hit returns what predict_batch and the
+        # inference service would. The generation keeps a score from a
+        # replaced model from being served after a swap.
+        values = self.cache.key(sensor_data)
+        key = (bundle.generation,) + values
+        quality_score = self.cache.get(key)
+        if quality_score is None:
+            quality_score = self._score(bundle, values)
+            self.cache.put(key, quality_score)
+        return quality_score
+    
+    def _score(self, bundle, values):
+        features = np.array(values, dtype=np.float64)
+        quality_score = bundle.compiled.predict_one(features)
         
         # Clamp between 0-100
         quality_score = max(0, min(100, quality_score))
         
         return round(quality_score, 2)
     
+    def predict_batch(self, sensor_data):
+        """
+        Predict quality scores for many readings in one model call
+        Input: (N, 4) array [pH, turbidity, temperature, TDS] or list of sensor dicts
+        Output: (N,) array of scores (0-100, 2 decimals)
+        """
+        X = to_feature_matrix(sensor_data)
+        if len(X) == 0:
+            return np.empty(0)
+        scores = self.active.predict(X)
+        return np.round(np.clip(scores, 0, 100), 2)
+    
+    def get_quality_status_batch(self, quality_scores):
+        """Vectorized get_quality_status"""
+        return STATUS_LABELS[np.digitize(quality_scores, STATUS_THRESHOLDS)]
+    
     def get_quality_status(self, quality_score):
         """
         Convert quality score to status
@@ -87,23 +263,18 @@ class QualityPredictor:
         else:
             return "Very Poor"
     
-    def get_quality_details(self, sensor_data):
+    def get_quality_details(self, sensor_data, quality_score=None, rules=None):
         """
         Get detailed quality analysis
+        (pass quality_score when it was already predicted elsewhere,
+        rules for a river's RuleSet instead of the default one)
         """
-        quality_score = self.predict_quality(sensor_data)
+        if quality_score is None:
+            quality_score = self.predict_quality(sensor_data)
         status = self.get_quality_status(quality_score)
         
         # Generate warnings
-        warnings = []
-        if sensor_data["pH"] < 6.5 or sensor_data["pH"] > 8.5:
-            warnings.append("pH level is out of safe range (6.5-8.5)")
-        if sensor_data["turbidity"] > 5:
-            warnings.append("Turbidity is high (>5 NTU)")
-        if sensor_data["temperature"] > 30:
-            warnings.append("Temperature is too high (>30°C)")
-        if sensor_data["TDS"] > 500:
-            warnings.append("TDS level is high (>500 ppm)")
+        warnings = (rules or get_rules()).warnings(sensor_data)
         
         result = {
             "quality_score": quality_score,
@@ -114,15 +285,48 @@ class QualityPredictor:
         
         return result
     
+    def get_quality_details_batch(self, sensor_data, rules=None):
+        """
+        get_quality_details for many readings: one predict call,
+        status and warnings from vectorized comparisons
+        """
+        X = to_feature_matrix(sensor_data)
+        scores = self.predict_batch(X)
+        statuses = self.get_quality_status_batch(scores)
+        warnings = (rules or get_rules()).warnings_batch(X)
+        
+        if isinstance(sensor_data, (list, tuple)) and len(sensor_data) and isinstance(sensor_data[0], dict):
+            inputs = sensor_data
+        else:
+            inputs = [dict(zip(FEATURES, row.tolist())) for row in X]
+        
+        results = []
+        for i in range(len(X)):
+            results.append({
+                "quality_score": float(scores[i]),
+                "status": str(statuses[i]),
+                "warnings": warnings[i],
+                "sensor_data": inputs[i]
+            })
+        return results
+    
     def save_model(self, filepath="quality_model.pkl"):
         """
         Save trained model to file
         """
-        with open(filepath, 'wb') as f:
+        bundle = self.active
+        if bundle.model is None:
+            raise ValueError("compiled-only model (loaded from .npz) cannot be pickled")
+        tmp_file = f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_file, 'wb') as f:
             pickle.dump({
-                'model': self.model,
-                'scaler': self.scaler
+                'model': bundle.model,
+                'scaler': bundle.scaler,
+                'version': MODEL_VERSION,
+                'sklearn_version': sklearn.__version__
             }, f)
+        # Atomic so other processes never load a half-written file
+        os.replace(tmp_file, filepath)
         print(f"Model saved to {filepath}")
     
     def load_model(self, filepath="quality_model.pkl"):
@@ -131,12 +335,83 @@ class QualityPredictor:
         """
         with open(filepath, 'rb') as f:
             data = pickle.load(f)
-            self.model = data['model']
-            self.scaler = data['scaler']
-            self.is_trained = True
+            if data.get('version', MODEL_VERSION) != MODEL_VERSION:
+                raise ValueError(f"{filepath} is model version {data.get('version')}, expected {MODEL_VERSION}")
+            self.sklearn_version = data.get('sklearn_version')
+        self.install(data['model'], data['scaler'], source=filepath)
+        print(f"Model loaded from {filepath}")
+    
+    def export_npz(self, filepath=MODEL_NPZ, bundle=None):
+        """
+        Save the compiled forest + scaler parameters as plain arrays
+        (no pickle, loads without sklearn and can be memory-mapped)
+        """
+        (bundle or self.active).compiled.save(filepath, meta={"version": MODEL_VERSION, "features": list(FEATURES)})
+        print(f"Model exported to {filepath}")
+    
+    def load_npz(self, filepath=MODEL_NPZ, mmap=True):
+        """
+        Load a model written by export_npz (memory-mapped by default)
+        Large batches then also use the compiled forest, since there is no
+        sklearn model to fall back on.
+        """
+        forest = CompiledForest.load(filepath, mmap=mmap)
+        if forest.meta.get("version") != MODEL_VERSION:
+            raise ValueError(f"{filepath} is model version {forest.meta.get('version')}, expected {MODEL_VERSION}")
+        if forest.meta.get("features") != list(FEATURES):
+            raise ValueError(f"{filepath} was trained on features {forest.meta.get('features')}")
+        self.install(None, None, compiled=forest, source=filepath)
         print(f"Model loaded from {filepath}")
 
 
+# ==================== SHARED PREDICTOR ====================
+
+_shared_predictor = None
+_shared_lock = threading.Lock()
+
+
+def load_or_train(filepath=MODEL_ARTIFACT, cache_size=0, npz_path=MODEL_NPZ):
+    """
+    Predictor from the on-disk artifacts: the memory-mapped .npz when it is
+    there, else the pickle; trains and saves both only when the pickle is
+    missing, from another model version or another sklearn
+    """
+    predictor = QualityPredictor(auto_train=False, cache_size=cache_size)
+    if npz_path:
+        try:
+            predictor.load_npz(npz_path)
+            return predictor
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Model arrays unusable ({e}), loading pickle...")
+    try:
+        predictor.load_model(filepath)
+        if predictor.sklearn_version != sklearn.__version__:
+            raise ValueError(f"built with sklearn {predictor.sklearn_version}")
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+        print(f"Model artifact unusable ({e}), training...")
+        predictor.train_model()
+        try:
+            predictor.save_model(filepath)
+        except OSError as e:
+            print(f"⚠️  Could not cache model: {e}")
+    if npz_path:
+        try:
+            predictor.export_npz(npz_path)
+        except OSError as e:
+            print(f"⚠️  Could not export model arrays: {e}")
+    return predictor
+
+
+def get_shared_predictor(filepath=MODEL_ARTIFACT):
+    """Process-wide predictor, created on first use and shared by all robots"""
+    global _shared_predictor
+    if _shared_predictor is None:
+        with _shared_lock:
+            if _shared_predictor is None:
+                _shared_predictor = load_or_train(filepath, cache_size=PREDICTION_CACHE_SIZE)
+    return _shared_predictor
+
+
 # Test the predictor
 if __name__ == "__main__":
     predictor = QualityPredictor()
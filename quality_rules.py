@@ -0,0 +1,136 @@
+# quality_rules.py
+# Declarative sensor safety rules, compiled into NumPy comparisons
+
+import copy
+import json
+import os
+import threading
+
+import numpy as np
+
+# Channel order of feature rows (same as the model's)
+CHANNELS = ("pH", "turbidity", "temperature", "TDS")
+
+# Optional JSON file: {"rules": [...], "rivers": {"river2": {"TDS": {"safe_max": 600}}}}
+RULES_FILE = os.environ.get("AQUATIC_RULES", "quality_rules.json")
+
+# warn: "outside" flags both bounds, "above"/"below" only one.
+# Messages and safe ranges are formatted from the bounds, so an override
+# changes the text too.
+DEFAULT_RULES = [
+    {"channel": "pH", "safe_min": 6.5, "safe_max": 8.5, "warn": "outside", "unit": "",
+     "message": "pH level is out of safe range ({safe_min:g}-{safe_max:g})"},
+    {"channel": "turbidity", "safe_min": 0, "safe_max": 5, "warn": "above", "unit": " NTU",
+     "message": "Turbidity is high (>{safe_max:g} NTU)"},
+    {"channel": "temperature", "safe_min": 15, "safe_max": 30, "warn": "above", "unit": "°C",
+     "message": "Temperature is too high (>{safe_max:g}°C)"},
+    {"channel": "TDS", "safe_min": 50, "safe_max": 500, "warn": "above", "unit": " ppm",
+     "message": "TDS level is high (>{safe_max:g} ppm)"},
+]
+
+
+class RuleSet:
+    """
+    Warning rules compiled to per-rule column index + low/high bound arrays
+
+    One comparison of an (N, 4) feature array against the bounds flags
+    every rule for every row, so a single reading, a batch and a whole
+    river history all go through the same code.
+    """
+
+    def __init__(self, rules):
+        self.rules = [dict(rule) for rule in rules]
+        for rule in self.rules:
+            if rule["channel"] not in CHANNELS:
+                raise ValueError(f"Unknown channel in quality rule: {rule['channel']}")
+            if rule["warn"] not in ("outside", "above", "below"):
+                raise ValueError(f"Unknown warn mode in quality rule: {rule['warn']}")
+
+        self.channels = [r["channel"] for r in self.rules]
+        self.columns = np.array([CHANNELS.index(c) for c in self.channels], dtype=np.intp)
+        self.low = np.array([r["safe_min"] if r["warn"] != "above" else -np.inf for r in self.rules], dtype=np.float64)
+        self.high = np.array([r["safe_max"] if r["warn"] != "below" else np.inf for r in self.rules], dtype=np.float64)
+        self.messages = [r["message"].format(**r) for r in self.rules]
+
+    def with_overrides(self, overrides):
+        """Copy with per-channel field overrides, e.g. {"TDS": {"safe_max": 600}}"""
+        rules = copy.deepcopy(self.rules)
+        for rule in rules:
+            rule.update(overrides.get(rule["channel"], {}))
+        return RuleSet(rules)
+
+    # ---------- evaluation ----------
+
+    def violations(self, X):
+        """(N, n_rules) bool array for an (N, 4) feature array"""
+        values = np.asarray(X, dtype=np.float64).reshape(-1, len(CHANNELS))[:, self.columns]
+        return (values < self.low) | (values > self.high)
+
+    def warnings(self, sensor_data):
+        """Warning messages for one reading (dict of channel values)"""
+        values = np.array([sensor_data[c] for c in self.channels], dtype=np.float64)
+        flagged = (values < self.low) | (values > self.high)
+        return [self.messages[i] for i in np.flatnonzero(flagged)]
+
+    def warnings_batch(self, X):
+        """Warning message lists for every row of an (N, 4) feature array"""
+        flagged = self.violations(X)
+        return [[self.messages[i] for i in np.flatnonzero(row)] for row in flagged]
+
+    def counts(self, X):
+        """How many rows break each rule: {message: count}"""
+        totals = self.violations(X).sum(axis=0)
+        return {message: int(n) for message, n in zip(self.messages, totals)}
+
+    # ---------- presentation ----------
+
+    def safe_range(self, channel):
+        for rule in self.rules:
+            if rule["channel"] == channel:
+                return f"{rule['safe_min']:g}-{rule['safe_max']:g}{rule['unit']}"
+        return None
+
+    def to_list(self):
+        return [dict(rule, text=message) for rule, message in zip(self.rules, self.messages)]
+
+
+# ==================== LOADING ====================
+
+_rule_sets = {}
+_river_overrides = {}
+_rules_lock = threading.Lock()
+
+
+def load_rules_config(path=RULES_FILE):
+    """Rules file contents, or the defaults when there is no file"""
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                config = json.load(f)
+            return {"rules": config.get("rules", DEFAULT_RULES), "rivers": config.get("rivers", {})}
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not read {path} ({e}), using default quality rules")
+    return {"rules": DEFAULT_RULES, "rivers": {}}
+
+
+def get_rules(river=None):
+    """Compiled rules for a river (its overrides applied), loaded once and cached"""
+    global _river_overrides
+    rules = _rule_sets.get(river)
+    if rules is None:
+        with _rules_lock:
+            if None not in _rule_sets:
+                config = load_rules_config()
+                _rule_sets[None] = RuleSet(config["rules"])
+                _river_overrides = config["rivers"]
+            if river not in _rule_sets:
+                overrides = _river_overrides.get(river)
+                _rule_sets[river] = _rule_sets[None].with_overrides(overrides) if overrides else _rule_sets[None]
+            rules = _rule_sets[river]
+    return rules
+
+
+def reload_rules():
+    """Drop the cache so the next get_rules() re-reads the rules file"""
+    with _rules_lock:
+        _rule_sets.clear()
@@ -0,0 +1,301 @@
+# reading_store.py
+# Columnar ring buffer for robot readings (NumPy backed)
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from aggregates import RunningAggregates
+from quality_rules import CHANNELS
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class ReadingStore:
+    """
+    Fixed-capacity ring buffer of readings stored column by column
+
+    Numeric channels live in NumPy arrays; repeated strings (robot id,
+    river, state, status, waste type) and warning/anomaly lists are interned in
+    small side tables and stored as integer codes. Indexing returns the
+    same nested dicts the JSON files use, so existing API code keeps
+    working, while aggregates run on the arrays directly.
+
+    Safe to share between the mission thread (writer) and Flask threads
+    (readers). `version` changes on every write and `token` is unique
+    per store instance, so together they identify the contents (ETags).
+    `total_count` is the size of the full history, which may be larger
+    than the buffer.
+    `aggregates` holds running statistics over everything appended.
+
+    Every reading carries a monotonically increasing `seq`; readings
+    that arrive without one (older files) are numbered on append.
+    """
+
+    # name -> dtype
+    COLUMNS = {
+        "pH": np.float64,
+        "turbidity": np.float64,
+        "temperature": np.float64,
+        "TDS": np.float64,
+        "score": np.float64,
+        "timestamp": np.int64,       # microseconds since epoch (naive)
+        "waste_weight": np.float64,
+        "waste_detected": np.bool_,
+        "mission": np.int32,
+        "seq": np.int64,
+    }
+    STRING_COLUMNS = ("robot_id", "river_name", "state", "status", "waste_type")
+    SENSORS = CHANNELS
+    KNOWN_KEYS = ("seq", "robot_id", "river_name", "timestamp", "mission", "state",
+                  "sensor_readings", "water_quality", "waste")
+
+    def __init__(self, capacity=1000, aggregate_window=50):
+        self.capacity = capacity
+        self._lock = threading.RLock()
+        self._new_data = threading.Condition(self._lock)
+        self.aggregates = RunningAggregates(window=aggregate_window)
+
+        self._cols = {name: np.zeros(capacity, dtype=dt) for name, dt in self.COLUMNS.items()}
+        for name in self.STRING_COLUMNS:
+            self._cols[name] = np.zeros(capacity, dtype=np.int16)
+        self._cols["warnings"] = np.zeros(capacity, dtype=np.int16)
+        self._cols["anomalies"] = np.zeros(capacity, dtype=np.int16)
+
+        # Interned side tables
+        self._strings = [None]
+        self._string_codes = {None: 0}
+        self._lists = [()]
+        self._list_codes = {(): 0}
+        self._extras = {}
+
+        self._start = 0
+        self._count = 0
+        self.token = os.urandom(4).hex()
+        self.version = 0
+        self.total_count = 0
+        self.last_seq = 0
+
+    @classmethod
+    def from_records(cls, records, capacity=None):
+        store = cls(capacity or max(len(records), 1))
+        store.extend(records)
+        return store
+
+    # ---------- writes ----------
+
+    def append(self, record):
+        with self._lock:
+            if self._count < self.capacity:
+                slot = (self._start + self._count) % self.capacity
+                self._count += 1
+            else:
+                slot = self._start
+                self._start = (self._start + 1) % self.capacity
+            self._write_slot(slot, record)
+            self.aggregates.add(record)
+            self.version += 1
+            self.total_count += 1
+            self._new_data.notify_all()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        """Drop all readings (seq keeps counting so cursors stay valid)"""
+        with self._lock:
+            self._start = 0
+            self._count = 0
+            self._extras = {}
+            self.aggregates.reset()
+            self.version += 1
+            self.total_count = 0
+
+    def _write_slot(self, slot, record):
+        cols = self._cols
+        sensors = record.get("sensor_readings", {})
+        quality = record.get("water_quality", {})
+        waste = record.get("waste", {})
+
+        for name in self.SENSORS:
+            cols[name][slot] = sensors.get(name, 0)
+        cols["score"][slot] = quality.get("score", 0)
+        cols["timestamp"][slot] = _to_micros(record.get("timestamp"))
+        cols["mission"][slot] = record.get("mission", 0)
+        seq = record.get("seq") or self.last_seq + 1
+        cols["seq"][slot] = seq
+        self.last_seq = max(self.last_seq, seq)
+        cols["waste_detected"][slot] = bool(waste.get("detected", False))
+        cols["waste_weight"][slot] = waste.get("weight", 0) or 0
+
+        cols["robot_id"][slot] = self._intern(record.get("robot_id"))
+        cols["river_name"][slot] = self._intern(record.get("river_name"))
+        cols["state"][slot] = self._intern(record.get("state"))
+        cols["status"][slot] = self._intern(quality.get("status"))
+        cols["waste_type"][slot] = self._intern(waste.get("type"))
+        cols["warnings"][slot] = self._intern_list(quality.get("warnings", []))
+        cols["anomalies"][slot] = self._intern_list(quality.get("anomalies", []))
+
+        extra = {k: v for k, v in record.items() if k not in self.KNOWN_KEYS}
+        if extra:
+            self._extras[slot] = extra
+        else:
+            self._extras.pop(slot, None)
+
+    def _intern(self, value):
+        code = self._string_codes.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._string_codes[value] = code
+        return code
+
+    def _intern_list(self, values):
+        key = tuple(values)
+        code = self._list_codes.get(key)
+        if code is None:
+            code = len(self._lists)
+            self._lists.append(key)
+            self._list_codes[key] = code
+        return code
+
+    # ---------- dict views ----------
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        with self._lock:
+            if isinstance(index, slice):
+                return [self._read_slot(self._slot(i)) for i in range(*index.indices(self._count))]
+            if index < 0:
+                index += self._count
+            if not 0 <= index < self._count:
+                raise IndexError("reading index out of range")
+            return self._read_slot(self._slot(index))
+
+    def to_list(self):
+        return self[:]
+
+    def where(self, mask):
+        """Readings (as dicts) where a boolean mask over column order is True"""
+        with self._lock:
+            return [self._read_slot(self._slot(int(i))) for i in np.flatnonzero(mask)]
+
+    def since(self, cursor, limit=100):
+        """
+        Readings with seq > cursor, oldest first, at most `limit`
+        Returns: (readings, more) - `more` means call again with the new cursor
+        """
+        with self._lock:
+            seqs = self.column("seq")
+            first = int(np.searchsorted(seqs, cursor, side="right"))
+            last = min(first + limit, self._count)
+            return self[first:last], last < self._count
+
+    def wait_for(self, cursor, timeout):
+        """Block until a reading newer than `cursor` arrives (or timeout)"""
+        with self._new_data:
+            if self.last_seq <= cursor:
+                self._new_data.wait(timeout)
+            return self.last_seq > cursor
+
+    def _slot(self, index):
+        return (self._start + index) % self.capacity
+
+    def _read_slot(self, slot):
+        cols = self._cols
+        strings = self._strings
+        detected = bool(cols["waste_detected"][slot])
+        record = {
+            "seq": int(cols["seq"][slot]),
+            "robot_id": strings[cols["robot_id"][slot]],
+            "river_name": strings[cols["river_name"][slot]],
+            "timestamp": _from_micros(cols["timestamp"][slot]),
+            "mission": int(cols["mission"][slot]),
+            "state": strings[cols["state"][slot]],
+            "sensor_readings": {name: float(cols[name][slot]) for name in self.SENSORS},
+            "water_quality": {
+                "score": float(cols["score"][slot]),
+                "status": strings[cols["status"][slot]],
+                "warnings": list(self._lists[cols["warnings"][slot]]),
+                "anomalies": list(self._lists[cols["anomalies"][slot]])
+            },
+            "waste": {
+                "detected": detected,
+                "type": strings[cols["waste_type"][slot]],
+                "weight": float(cols["waste_weight"][slot]) if detected else 0
+            }
+        }
+        extra = self._extras.get(slot)
+        if extra:
+            record.update(extra)
+        return record
+
+    # ---------- vectorized access ----------
+
+    def column(self, name, last=None):
+        """Copy of one column in insertion order, optionally only the last N"""
+        with self._lock:
+            n = self._count if last is None else min(last, self._count)
+            first = self._start + self._count - n
+            idx = np.arange(first, first + n) % self.capacity
+            return self._cols[name][idx]
+
+    def columns(self, names, last=None):
+        """Several columns copied under one lock (rows stay aligned)"""
+        with self._lock:
+            return {name: self.column(name, last) for name in names}
+
+    def epoch_seconds(self, last=None):
+        return self.column("timestamp", last) / 1e6
+
+    def mean(self, name, last=None):
+        values = self.column(name, last)
+        return float(values.mean()) if len(values) else 0.0
+
+    def mask(self, mission=None, start=None, end=None):
+        """Boolean mask for a mission and/or ISO timestamp range (inclusive)"""
+        with self._lock:
+            keep = np.ones(self._count, dtype=bool)
+            if mission is not None:
+                keep &= self.column("mission") == int(mission)
+            if start is not None or end is not None:
+                ts = self.column("timestamp")
+                if start is not None:
+                    keep &= ts >= _to_micros(start)
+                if end is not None:
+                    keep &= ts <= _to_micros(end)
+            return keep
+
+    def etag(self):
+        return f"{self.token}-{self.version}"
+
+    def statuses(self, last=None):
+        codes = self.column("status", last)
+        return [self._strings[c] for c in codes]
+
+    def nbytes(self):
+        return sum(col.nbytes for col in self._cols.values())
+
+
+def _to_micros(timestamp):
+    if not timestamp:
+        return 0
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros):
+    return (EPOCH + timedelta(microseconds=int(micros))).isoformat()
@@ -1,105 +1,132 @@
 # robot_controller_final_fixed.py
 # FIXED - Proper JSON structure for waste tracking
 
-import time
-import json
+import math
 import os
+import time
 import threading
 from datetime import datetime
 from sensor_reader import SensorReader
-from quality_predictor import QualityPredictor
+from inference_service import get_predictor
+from data_storage import open_storage, river_key, BackgroundWriter
+from reading_store import ReadingStore
+from event_bus import EventBus
+from quality_rules import get_rules
+from anomaly_detector import AnomalyDetector
+from mission_scheduler import get_scheduler
+from fleet import FleetRegistry
+from edge_aggregator import EdgeAggregator
+from sim_clock import get_clock
+
+DEFAULT_SAMPLE_RATE = float(os.environ.get("AQUATIC_SAMPLE_RATE", "1"))  # readings per second
+MAX_SAMPLE_RATE = 50.0
+DEFAULT_AGGREGATE_WINDOW = float(os.environ.get("AQUATIC_AGGREGATE_WINDOW", "0"))  # seconds, 0 stores every reading
 
 class AquaticRobot:
     """Fixed robot with proper JSON structure"""
     
-    def __init__(self, robot_id="robot-001", river_name="River 1", data_file="robot_data.json"):
+    def __init__(self, robot_id="robot-001", river_name="River 1", data_file="robot_data.json",
+                 storage=None, writer_options=None, predictor=None, scheduler=None,
+                 sample_rate_hz=DEFAULT_SAMPLE_RATE, aggregate_window=DEFAULT_AGGREGATE_WINDOW, clock=None):
         self.robot_id = robot_id
         self.river_name = river_name
-        self.sensor_reader = SensorReader()
-        self.quality_predictor = QualityPredictor()
+        # Real time by default; a SimulatedClock replays missions at Nx or max speed
+        self.clock = clock or (scheduler.clock if scheduler else get_clock())
+        self.sensor_reader = SensorReader(clock=self.clock)
+        self._predictor = predictor
+        self.rules = get_rules(river_key(data_file))
+        self.anomaly_detector = AnomalyDetector()
         
         self.data_file = data_file
-        self.all_data = []
+        self.storage = storage or open_storage(data_file)
+        self.all_data = ReadingStore(capacity=1000)
         self.waste_collected = 0
+        # Optional: persist window summaries (+ readings that trip a rule) instead of every reading
+        self.aggregator = EdgeAggregator(aggregate_window) if aggregate_window else None
         
         self.state = "IDLE"
-        self.is_running = False
         self.mission_count = 0
+        self.sample_rate_hz = check_sample_rate(sample_rate_hz)
+        self._scheduler = scheduler
+        self._mission = None
+        self._mission_lock = threading.Lock()
+        
+        # Live readings/status changes for the SSE stream
+        self.events = EventBus()
+        self.status_version = 0
+        # Readings taken; with edge aggregation most never reach all_data
+        self.samples_taken = 0
         
         self.load_existing_data()
+        
+        # Disk writes happen on this thread, not in the mission loop
+        self.writer = BackgroundWriter(self.storage, **(writer_options or {}))
         print(f"✓ Robot {robot_id} initialized for {river_name}!")
     
+    @property
+    def quality_predictor(self):
+        """Injected predictor, else the process-wide one (loaded on first reading)"""
+        return self._predictor or get_predictor()
+    
     def load_existing_data(self):
-        """Load existing data from file - FIXED"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    file_data = json.load(f)
-                    
-                    # Handle both old and new format
-                    if isinstance(file_data, dict):
-                        self.all_data = file_data.get('readings', [])
-                        self.waste_collected = file_data.get('total_waste', 0)
-                    elif isinstance(file_data, list):
-                        # Old format - convert to new
-                        self.all_data = file_data
-                        self.waste_collected = sum(
-                            d.get('waste', {}).get('weight', 0) 
-                            for d in file_data
-                        )
-                        
-                print(f"✓ Loaded {len(self.all_data)} readings")
-            except Exception as e:
-                print(f"⚠️  Error loading data: {e}")
-                self.all_data = []
-                self.waste_collected = 0
+        """Load the most recent readings into memory"""
+        try:
+            readings, self.waste_collected = self.storage.load_recent(self.all_data.capacity)
+            self.all_data.extend(readings)
+            self.all_data.total_count = max(len(readings), self.storage.count())
+            self.anomaly_detector.prime(readings)
+            if readings:
+                # Replays on a simulated clock continue after the stored history
+                self.clock.not_before(datetime.fromisoformat(max(r["timestamp"] for r in readings)))
+            print(f"✓ Loaded {len(self.all_data)} readings")
+        except Exception as e:
+            print(f"⚠️  Error loading data: {e}")
+            self.all_data.clear()
+            self.waste_collected = 0
     
     def save_data_to_file(self, robot_data):
-        """Save data point to file - FIXED"""
+        """Queue data point for the background writer (in-memory data is the source of truth)"""
         try:
-            # Load current data
-            if os.path.exists(self.data_file):
-                try:
-                    with open(self.data_file, 'r') as f:
-                        file_data = json.load(f)
-                        
-                        # Handle both formats
-                        if isinstance(file_data, dict):
-                            self.all_data = file_data.get('readings', [])
-                            self.waste_collected = file_data.get('total_waste', 0)
-                        elif isinstance(file_data, list):
-                            self.all_data = file_data
-                except:
-                    self.all_data = []
-            
-            # Update waste
-            waste_weight = robot_data.get('waste', {}).get('weight', 0)
-            self.waste_collected += waste_weight
-            
-            # Add new reading
-            self.all_data.append(robot_data)
-            
-            # Keep only last 1000
-            if len(self.all_data) > 1000:
-                self.all_data = self.all_data[-1000:]
-            
-            # Save with proper structure
-            save_data = {
-                'readings': self.all_data,
-                'total_waste': self.waste_collected,
-                'last_update': datetime.now().isoformat()
-            }
-            
-            with open(self.data_file, 'w') as f:
-                json.dump(save_data, f)
-            
+            records = self.aggregator.add(robot_data) if self.aggregator else [robot_data]
+            for record in records:
+                self._store(record)
         except Exception as e:
             print(f"  ❌ Error saving: {e}")
     
+    def _store(self, record):
+        # Add new reading (ring buffer keeps only last 1000)
+        record["seq"] = self.all_data.last_seq + 1
+        self.all_data.append(record)
+        
+        # Write only the new record, compact periodically
+        self.writer.submit(record)
+        if self.writer.wants_compaction():
+            self.writer.request_compaction(self.all_data, self.waste_collected)
+        
+        if "summary" in record and self.events.subscriber_count:
+            self.events.publish("summary", {"summary": record, "status": self.get_status()})
+    
+    def flush_aggregates(self):
+        """Store the summary of the open aggregation window (end of mission)"""
+        summary = self.aggregator.flush() if self.aggregator else None
+        if summary:
+            self._store(summary)
+    
+    def clear_data(self):
+        """Delete stored readings for this robot"""
+        self.writer.clear()
+        self.all_data.clear()
+        self.anomaly_detector.reset()
+        if self.aggregator:
+            self.aggregator.clear()
+        self.waste_collected = 0
+        self.publish_status()
+    
     def simulate_waste_collection(self):
         """Simulate waste collection"""
         import random
-        if random.random() < 0.15:
+        # 15% chance per second of mission, whatever the sample rate
+        if random.random() < 1 - 0.85 ** self.sample_interval:
             waste_types = ["plastic_bottle", "plastic_bag", "foam", "organic"]
             waste_type = random.choice(waste_types)
             waste_weight = random.uniform(0.1, 0.5)
@@ -113,14 +140,18 @@ class AquaticRobot:
     def read_and_save_sensors(self):
         """Read sensors and save data"""
         sensor_data = self.sensor_reader.read_all_sensors()
-        quality_details = self.quality_predictor.get_quality_details(sensor_data)
+        quality_details = self.quality_predictor.get_quality_details(sensor_data, rules=self.rules)
+        anomalies = self.anomaly_detector.update(sensor_data)
+        if anomalies:
+            print("  📈 ANOMALY: " + ", ".join(f"{name} (z={z})" for name, z in anomalies.items()))
         
         waste_type, waste_weight = self.simulate_waste_collection()
         
         robot_data = {
+            "seq": None,  # assigned when stored
             "robot_id": self.robot_id,
             "river_name": self.river_name,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": self.sensor_reader.last_read_at.isoformat(),
             "mission": self.mission_count,
             "state": self.state,
             "sensor_readings": {
@@ -132,7 +163,8 @@ class AquaticRobot:
             "water_quality": {
                 "score": quality_details["quality_score"],
                 "status": quality_details["status"],
-                "warnings": quality_details["warnings"]
+                "warnings": quality_details["warnings"],
+                "anomalies": list(anomalies)
             },
             "waste": {
                 "detected": waste_type is not None,
@@ -142,100 +174,168 @@ class AquaticRobot:
         }
         
         self.save_data_to_file(robot_data)
+        self.samples_taken += 1
+        
+        if self.events.subscriber_count:
+            self.events.publish("reading", {"reading": robot_data, "status": self.get_status()})
         return robot_data
     
-    def run_mission_in_thread(self, duration_seconds=300):
-        """Run mission in background thread"""
-        def mission_worker():
-            self.mission_count += 1
-            self.is_running = True
-            self.state = "NAVIGATING"
-            
-            print(f"\n{'='*70}")
-            print(f"🚀 MISSION #{self.mission_count} - {self.river_name}")
-            print(f"⏱️  Duration: {duration_seconds}s")
-            print(f"{'='*70}\n")
-            
-            mission_start = time.time()
-            
-            try:
-                while self.is_running:
-                    elapsed = time.time() - mission_start
-                    remaining = duration_seconds - elapsed
-                    
-                    if elapsed > duration_seconds:
-                        print(f"\n✓ Mission completed!")
-                        self.is_running = False
-                        break
-                    
-                    robot_data = self.read_and_save_sensors()
-                    
-                    quality = robot_data['water_quality']
-                    sensors = robot_data['sensor_readings']
-                    
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {self.river_name}")
-                    print(f"  pH: {sensors['pH']:.2f} | Quality: {quality['score']:.1f}")
-                    print(f"  Total waste: {self.waste_collected:.2f}kg\n")
-                    
-                    time.sleep(1)
-            
-            except Exception as e:
-                print(f"❌ Error: {e}")
-            
-            finally:
-                self.is_running = False
+    @property
+    def scheduler(self):
+        """Injected scheduler, else the process-wide one for this robot's clock"""
+        return self._scheduler or get_scheduler(self.clock)
+    
+    @property
+    def is_running(self):
+        mission = self._mission
+        return mission is not None and mission.active
+    
+    @property
+    def sample_interval(self):
+        return 1.0 / self.sample_rate_hz
+    
+    def set_sample_rate(self, sample_rate_hz):
+        """Change the sampling rate (applies from the next tick of a running mission)"""
+        self.sample_rate_hz = check_sample_rate(sample_rate_hz)
+        mission = self._mission
+        if mission is not None and mission.active:
+            mission.set_interval(self.sample_interval)
+        self.publish_status()
+    
+    def run_mission(self, duration_seconds=300):
+        """Schedule sensor ticks at sample_rate_hz on the shared mission scheduler"""
+        self.mission_count += 1
+        self.state = "NAVIGATING"
+        self._tick_count = 0
+        
+        print(f"\n{'='*70}")
+        print(f"🚀 MISSION #{self.mission_count} - {self.river_name}")
+        print(f"⏱️  Duration: {duration_seconds}s @ {self.sample_rate_hz:g} Hz")
+        print(f"{'='*70}\n")
         
-        thread = threading.Thread(target=mission_worker, daemon=True)
-        thread.start()
+        self._mission = self.scheduler.schedule(
+            self._mission_tick, interval=self.sample_interval, duration=duration_seconds,
+            on_finish=self._mission_finished, name=f"{self.robot_id} mission #{self.mission_count}")
+        self.publish_status()
     
-    def start_mission(self, duration_seconds=300):
-        """Start mission"""
-        if not self.is_running:
-            self.run_mission_in_thread(duration_seconds)
-            return {"status": "started", "message": f"Mission started"}
-        else:
-            return {"status": "already_running", "message": "Already running"}
+    def _mission_tick(self):
+        robot_data = self.read_and_save_sensors()
+        
+        # Console line about once a second, however fast we sample
+        self._tick_count += 1
+        if self._tick_count % max(1, round(self.sample_rate_hz)):
+            return
+        quality = robot_data['water_quality']
+        sensors = robot_data['sensor_readings']
+        
+        print(f"[{self.clock.now().strftime('%H:%M:%S')}] {self.river_name}")
+        print(f"  pH: {sensors['pH']:.2f} | Quality: {quality['score']:.1f}")
+        print(f"  Total waste: {self.waste_collected:.2f}kg\n")
+    
+    def _mission_finished(self, mission):
+        """Runs once after the last tick, however the mission ended"""
+        if mission.end_reason == "completed":
+            print(f"\n✓ Mission completed!")
+        self.flush_aggregates()
+        self.writer.flush(timeout=5)
+        self.publish_status()
+    
+    def start_mission(self, duration_seconds=300, sample_rate_hz=None):
+        """Start mission (optionally at a new sampling rate)"""
+        if sample_rate_hz is not None:
+            try:
+                sample_rate_hz = check_sample_rate(sample_rate_hz)
+            except ValueError as e:
+                return {"status": "error", "message": str(e)}
+        with self._mission_lock:
+            if not self.is_running and sample_rate_hz is not None:
+                self.sample_rate_hz = sample_rate_hz
+            if not self.is_running:
+                self.run_mission(duration_seconds)
+                return {"status": "started", "message": f"Mission started"}
+        return {"status": "already_running", "message": "Already running"}
     
     def stop_mission(self):
-        """Stop mission"""
-        if self.is_running:
-            self.is_running = False
+        """Stop mission (returns after the in-flight tick and the final flush)"""
+        mission = self._mission
+        if mission is not None and mission.cancel():
+            mission.wait(timeout=10)
             return {"status": "stopped", "message": "Mission stopped"}
         else:
             return {"status": "not_running", "message": "Not running"}
     
+    def close(self):
+        """Stop any mission and shut down the writer (robot removed from the fleet)"""
+        self.stop_mission()
+        self.writer.close()
+    
+    def publish_status(self):
+        """Record a status change and push it to stream subscribers"""
+        self.status_version += 1
+        if self.events.subscriber_count:
+            self.events.publish("status", self.get_status())
+    
+    def status_etag(self):
+        """Changes whenever get_status() could return something different"""
+        return f"{self.all_data.etag()}-{self.status_version}-{self.samples_taken}"
+    
     def get_status(self):
-        """Get robot status"""
+        """Get robot status (O(1): counts come from running aggregates)"""
+        aggregates = self.all_data.aggregates
+        mission = self._mission
         return {
             "robot_id": self.robot_id,
             "river_name": self.river_name,
             "is_running": self.is_running,
             "mission_count": self.mission_count,
             "state": self.state,
+            "sample_rate_hz": self.sample_rate_hz,
+            "ticks": mission.ticks if mission else 0,
+            "missed_ticks": mission.missed if mission else 0,
+            "max_tick_lateness_ms": round(mission.max_lateness * 1000, 3) if mission else 0.0,
+            "aggregation": self.aggregator.get_stats() if self.aggregator else None,
             "data_points": len(self.all_data),
             "waste_collected": round(self.waste_collected, 2),
-            "waste_items": sum(
-                1 for d in self.all_data 
-                if d.get('waste', {}).get('detected', False)
-            )
+            "waste_items": aggregates.waste_items,
+            "waste_by_type": dict(aggregates.waste_by_type),
+            "anomalies": aggregates.anomalies,
+            "anomalies_by_channel": dict(aggregates.anomalies_by_channel)
         }
 
+def check_sample_rate(sample_rate_hz):
+    rate = float(sample_rate_hz)
+    if not 0 < rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"Sample rate must be above 0 and at most {MAX_SAMPLE_RATE:g} Hz")
+    return rate
+
+def check_aggregate_window(aggregate_window):
+    window = float(aggregate_window)
+    if not (window >= 0 and math.isfinite(window)):
+        raise ValueError("Aggregate window must be a number of seconds, 0 or more")
+    return window
 
-# ==================== 5 ROBOTS ====================
 
-robots = {
-    "river1": AquaticRobot(robot_id="robot-001", river_name="River 1", data_file="robot_data_river1.json"),
-    "river2": AquaticRobot(robot_id="robot-002", river_name="River 2", data_file="robot_data_river2.json"),
-    "river3": AquaticRobot(robot_id="robot-003", river_name="River 3", data_file="robot_data_river3.json"),
-    "river4": AquaticRobot(robot_id="robot-004", river_name="River 4", data_file="robot_data_river4.json"),
-    "river5": AquaticRobot(robot_id="robot-005", river_name="River 5", data_file="robot_data_river5.json"),
-}
+# ==================== FLEET ====================
 
-def start_mission_api(river_id, duration=300):
+# Built on first access; add/remove rivers at runtime or via fleet.json
+robots = FleetRegistry(AquaticRobot)
+
+def start_mission_api(river_id, duration=300, sample_rate_hz=None):
     if river_id in robots:
-        return robots[river_id].start_mission(duration)
+        return robots[river_id].start_mission(duration, sample_rate_hz)
     return {"error": "River not found"}
 
+def set_sample_rate_api(river_id, sample_rate_hz):
+    if river_id not in robots:
+        return {"error": "River not found"}
+    robot = robots[river_id]
+    try:
+        robot.set_sample_rate(sample_rate_hz)
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "message": str(e)}
+    robots.update(river_id, sample_rate_hz=robot.sample_rate_hz)
+    return {"status": "success", "sample_rate_hz": robot.sample_rate_hz}
+
 def stop_mission_api(river_id):
     if river_id in robots:
         return robots[river_id].stop_mission()
@@ -251,8 +351,8 @@ if __name__ == "__main__":
     print("🤖 AQUATIC ROBOT - FIXED VERSION")
     print("="*70)
     print("\nAvailable Rivers:")
-    for rid, robot in robots.items():
-        print(f"  {rid}: {robot.river_name}")
+    for rid, config in robots.configs().items():
+        print(f"  {rid}: {config['river_name']}")
     print("\n" + "="*70 + "\n")
     
     try:
@@ -3,6 +3,9 @@
 
 import random
 
+from quality_rules import get_rules
+from sim_clock import get_clock
+
 class SensorReader:
     """
     Simulated sensor reader with REALISTIC values
@@ -17,7 +20,11 @@ class SensorReader:
     by the Aquatic Robot's onboard sensors during scanning.
     """
     
-    def __init__(self):
+    def __init__(self, clock=None):
+        # Readings are stamped on this clock (simulated for mission replay)
+        self.clock = clock or get_clock()
+        self.last_read_at = None
+        
         # Set baseline realistic values for a typical river
         self.base_ph = 7.0  # Neutral
         self.base_turbidity = 3.5  # Slightly turbid
@@ -30,7 +37,9 @@ class SensorReader:
         
         Returns:
             dict: Sensor readings with realistic fluctuations
+            (sample time in self.last_read_at)
         """
+        self.last_read_at = self.clock.now()
         
         # pH: Usually 6.5-8.5 (safe range), slight variation
         # Normal range: 6.5-8.5, we add ±0.3 variation
@@ -60,14 +69,15 @@ class SensorReader:
         }
     
     @staticmethod
-    def get_sensor_info():
-        """Information about sensors for presentation"""
+    def get_sensor_info(river=None):
+        """Information about sensors for presentation (safe ranges from the quality rules)"""
+        rules = get_rules(river)
         return {
             "pH": {
                 "name": "pH Sensor (Digital pH Meter)",
                 "unit": "pH",
                 "range": "0-14",
-                "safe_range": "6.5-8.5",
+                "safe_range": rules.safe_range("pH"),
                 "what_it_measures": "Acidity or alkalinity of water",
                 "sensor_type": "Glass electrode pH sensor",
                 "accuracy": "±0.1 pH"
@@ -76,7 +86,7 @@ class SensorReader:
                 "name": "Turbidity Sensor (Nephelometer)",
                 "unit": "NTU (Nephelometric Turbidity Unit)",
                 "range": "0-10+ NTU",
-                "safe_range": "0-5 NTU",
+                "safe_range": rules.safe_range("turbidity"),
                 "what_it_measures": "Water clarity/cloudiness caused by suspended particles",
                 "sensor_type": "Optical turbidity sensor",
                 "accuracy": "±0.3 NTU"
@@ -85,7 +95,7 @@ class SensorReader:
                 "name": "Temperature Sensor (Thermometer)",
                 "unit": "°C (Celsius)",
                 "range": "0-50°C",
-                "safe_range": "15-30°C",
+                "safe_range": rules.safe_range("temperature"),
                 "what_it_measures": "Water temperature",
                 "sensor_type": "DS18B20 Digital Temperature Sensor",
                 "accuracy": "±0.5°C"
@@ -94,7 +104,7 @@ class SensorReader:
                 "name": "TDS Sensor (Conductivity Meter)",
                 "unit": "ppm (parts per million)",
                 "range": "0-1000+ ppm",
-                "safe_range": "50-500 ppm",
+                "safe_range": rules.safe_range("TDS"),
                 "what_it_measures": "Total dissolved solids (salts, minerals, etc.)",
                 "sensor_type": "Conductivity probe",
                 "accuracy": "±5 ppm"
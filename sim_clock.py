@@ -0,0 +1,116 @@
+# sim_clock.py
+# Injectable clocks: wall time, or simulated time for accelerated mission replay
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# "" = real time, a number = simulated at that speed, "max" = as fast as possible
+CLOCK_SPEED = os.environ.get("AQUATIC_CLOCK_SPEED", "")
+
+
+class SystemClock:
+    """Real time: datetime.now() for timestamps, time.monotonic() for scheduling"""
+
+    speed = 1.0
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def not_before(self, moment):
+        """Real time can't be moved"""
+
+
+class SimulatedClock:
+    """
+    Simulated time starting at `start` (default: now)
+
+    With a `speed` it runs that many times faster than real time. With
+    speed=None it only moves when advanced; the mission scheduler then
+    jumps straight to the next due tick once the previous ones have
+    finished, so a mission runs as fast as the pipeline allows.
+    Timestamps from now() stay consistent with the simulated seconds.
+
+    Robots move the clock past their river's last stored reading
+    (not_before), so a replay never writes timestamps older than its
+    history. It can still write timestamps a later real-time mission
+    falls behind; storage orders by seq, but keep replays on their own
+    river or AQUATIC_DB if reports should stay in time order.
+    """
+
+    def __init__(self, speed=None, start=None):
+        if speed is not None and speed <= 0:
+            raise ValueError("Clock speed must be positive (None = as fast as possible)")
+        self.speed = speed
+        self.start = start or datetime.now()
+        self._lock = threading.Lock()
+        self._offset = 0.0
+        self._real_start = time.monotonic()
+
+    def monotonic(self):
+        """Simulated seconds since the clock was created"""
+        with self._lock:
+            return self._elapsed()
+
+    def now(self):
+        with self._lock:
+            return self.start + timedelta(seconds=self._elapsed())
+
+    def not_before(self, moment):
+        """Jump forward so now() is later than `moment` (never moves back)"""
+        with self._lock:
+            behind = (moment - self.start).total_seconds() - self._elapsed()
+            if behind >= 0:
+                self.start += timedelta(seconds=behind + 1)
+
+    def _elapsed(self):
+        elapsed = self._offset
+        if self.speed:
+            elapsed += (time.monotonic() - self._real_start) * self.speed
+        return elapsed
+
+    def advance(self, seconds):
+        with self._lock:
+            self._offset += seconds
+
+    def sleep(self, seconds):
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        else:
+            self.advance(seconds)
+
+
+SYSTEM_CLOCK = SystemClock()
+
+_clock = None
+_clock_lock = threading.Lock()
+
+
+def parse_speed(value):
+    """AQUATIC_CLOCK_SPEED value -> clock ("" real time, "max" as fast as possible, "60" 60x)"""
+    value = (value or "").strip().lower()
+    if not value:
+        return SYSTEM_CLOCK
+    if value in ("max", "0"):
+        return SimulatedClock(speed=None)
+    return SimulatedClock(speed=float(value))
+
+
+def get_clock():
+    """Process-wide default clock (real time unless AQUATIC_CLOCK_SPEED is set)"""
+    global _clock
+    if _clock is None:
+        with _clock_lock:
+            if _clock is None:
+                _clock = parse_speed(CLOCK_SPEED)
+                if _clock is not SYSTEM_CLOCK:
+                    speed = f"{_clock.speed:g}x" if _clock.speed else "max speed"
+                    print(f"⏩ Simulated clock: {speed}")
+    return _clock
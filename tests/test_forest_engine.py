@@ -0,0 +1,56 @@
+# tests/test_forest_engine.py
+# CompiledForest must score bit-for-bit like the sklearn forest + scaler
+
+import numpy as np
+import pytest
+
+from forest_engine import CompiledForest, equivalence_samples
+from quality_predictor import QualityPredictor
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    return QualityPredictor()
+
+
+@pytest.fixture(scope="module")
+def forest(predictor):
+    return CompiledForest.from_sklearn(predictor.model, predictor.scaler)
+
+
+@pytest.fixture(scope="module")
+def samples(predictor, forest):
+    X, n_edges = equivalence_samples(forest)
+    expected = predictor.model.predict(predictor.scaler.transform(X))
+    return X, n_edges, expected
+
+
+def test_has_split_boundary_rows(samples):
+    X, n_edges, _ = samples
+    assert n_edges > 0
+    assert len(X) > n_edges
+
+
+def test_batch_matches_sklearn(forest, samples):
+    X, _, expected = samples
+    assert np.array_equal(forest.predict(X), expected)
+
+
+def test_boundary_rows_match_sklearn(forest, samples):
+    X, n_edges, expected = samples
+    assert np.array_equal(forest.predict(X[-n_edges:]), expected[-n_edges:])
+
+
+def test_single_sample_matches_sklearn(forest, samples):
+    X, n_edges, expected = samples
+    rows = np.concatenate([np.arange(1000), np.arange(len(X) - n_edges, len(X))])
+    got = np.array([forest.predict_one(X[i]) for i in rows])
+    assert np.array_equal(got, expected[rows])
+
+
+def test_npz_round_trip_matches(forest, samples, tmp_path):
+    X, _, expected = samples
+    path = tmp_path / "model.npz"
+    forest.save(str(path))
+    loaded = CompiledForest.load(str(path))
+    assert np.array_equal(loaded.predict(X), expected)